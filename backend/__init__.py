@@ -0,0 +1,4 @@
+import time
+
+# Reference point for the cold-start report in backend.coldstart
+import_started = time.perf_counter()
@@ -1,18 +1,36 @@
+import asyncio
+import hashlib
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel, Field
+from sqlalchemy.orm import make_transient_to_detached
 from sqlmodel import Session, select
-from typing import Optional
+from typing import Optional, Tuple
 
+from .cache import TTLCache
 from .database import get_session
+from .metrics import timed_password_hash
+from .ratelimit import ConcurrencyLimiter, rate_limit
 from .schema import UserInDB
 from .models import UserCreate, Token, UserPublic, UserResponse
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+bcrypt_rounds = int(os.environ.get("BCRYPT_ROUNDS", 12))
+password_hash_workers = int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+# bcrypt releases the GIL, so a small dedicated thread pool bounds how many hashes run at
+# once without tying up the event loop or the threadpool that serves sync routes
+password_hash_pool = ThreadPoolExecutor(max_workers=password_hash_workers, thread_name_prefix="bcrypt")
+# Logins and registrations beyond this wait for a slot, and beyond the queue depth are shed
+# with a 503; queueing many more than the pool can hash only adds latency
+password_hash_limiter = ConcurrencyLimiter(
+    "password_hash",
+    limit=int(os.environ.get("PASSWORD_HASH_CONCURRENCY", 2 * password_hash_workers)),
+    max_queue=int(os.environ.get("PASSWORD_HASH_QUEUE_DEPTH", 8 * password_hash_workers)),
+)
 access_token_duration = 3600  # seconds
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 jwt_key = os.environ.get(
@@ -21,6 +39,12 @@ jwt_key = os.environ.get(
 )
 jwt_alg = "HS256"
 
+# Decoded tokens keyed by token hash, and user rows keyed by id. Each worker keeps its own
+# copy, so a change made through another worker is seen after at most `principal_cache_ttl`.
+principal_cache_ttl = int(os.environ.get("PRINCIPAL_CACHE_TTL", 60))  # seconds
+token_cache = TTLCache(maxsize=int(os.environ.get("TOKEN_CACHE_SIZE", 10000)), ttl=access_token_duration)
+principal_cache = TTLCache(maxsize=int(os.environ.get("PRINCIPAL_CACHE_SIZE", 10000)), ttl=principal_cache_ttl)
+
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
@@ -31,47 +55,141 @@ class UserUpdate(BaseModel):
 
 
 # Methods ========================================
-async def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> UserInDB:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail={
-            "error": "invalid_client",
-            "error_description": "invalid access token"
-        },
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+# passlib (with bcrypt) and jose (with cryptography) take tens of milliseconds to import, so
+# they are imported on first use to keep them out of the Lambda cold start.
+def _get_pwd_context():
+    global pwd_context
     try:
-        payload = jwt.decode(token, jwt_key, algorithms=[jwt_alg])
-        user_id: int = int(payload.get("sub"))
-        if user_id is None:
+        return pwd_context
+    except NameError:
+        from passlib.context import CryptContext
+
+        pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=bcrypt_rounds)
+        return pwd_context
+
+
+def __getattr__(name):
+    if name == "pwd_context":
+        return _get_pwd_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail={
+        "error": "invalid_client",
+        "error_description": "invalid access token"
+    },
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+def decode_access_token(token: str) -> dict:
+    """Verify and decode a token, reusing the result for repeat presentations of the same token."""
+    token_hash = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(token_hash)
+    if payload is None:
+        from jose import JWTError, jwt
+
+        try:
+            payload = jwt.decode(token, jwt_key, algorithms=[jwt_alg])
+        except JWTError:
             raise credentials_exception
-        user = session.exec(select(UserInDB).where(UserInDB.id == user_id)).first()
-        if user is None:
+        # Tokens without an expiry are never issued here, and would never expire
+        if payload.get("sub") is None or not isinstance(payload.get("exp"), (int, float)):
             raise credentials_exception
-        return user
-    except JWTError:
+        token_cache.set(token_hash, payload, ttl=min(access_token_duration, payload["exp"] - time.time()))
+    elif payload["exp"] <= time.time():
+        raise credentials_exception
+    return payload
+
+
+def get_token_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    return decode_access_token(token)
+
+
+def get_current_user_id(claims: dict = Depends(get_token_claims)) -> int:
+    """The authenticated user's id, taken from the token without touching the database."""
+    return int(claims["sub"])
+
+
+def current_user_key(user_id: int = Depends(get_current_user_id)) -> str:
+    """Rate limit key for authenticated routes."""
+    return f"user:{user_id}"
+
+
+def get_current_user(user_id: int = Depends(get_current_user_id), session: Session = Depends(get_session)) -> UserInDB:
+    cached = principal_cache.get(user_id)
+    if cached is not None:
+        # Attach a copy to this session without a SELECT so handlers can still modify and save it
+        user = UserInDB(**cached)
+        make_transient_to_detached(user)
+        return session.merge(user, load=False)
+
+    user = session.get(UserInDB, user_id)
+    if user is None:
         raise credentials_exception
+    principal_cache.set(user_id, user.model_dump())
+    return user
+
+
+def invalidate_principal(user_id: int) -> None:
+    principal_cache.delete(user_id)
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hash_pool.submit(
+        timed_password_hash, "verify", _get_pwd_context().verify, plain_password, hashed_password
+    ).result()
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_hash_pool.submit(timed_password_hash, "hash", _get_pwd_context().hash, password).result()
+
+
+async def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Verify on the hash pool; also returns a new hash if the stored one uses outdated settings."""
+    future = password_hash_pool.submit(
+        timed_password_hash, "verify", _get_pwd_context().verify_and_update, plain_password, hashed_password
+    )
+    return await asyncio.wrap_future(future)
+
 
+def _get_user_by_username(session: Session, username: str) -> Optional[UserInDB]:
+    return session.exec(select(UserInDB).where(UserInDB.username == username)).first()
 
-def authenticate_user(session: Session, username: str, password: str) -> Optional[UserInDB]:
-    user = session.exec(select(UserInDB).where(UserInDB.username == username)).first()
-    if not user or not verify_password(password, user.hashed_password):
+
+def _save_user(session: Session, user: UserInDB) -> None:
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+
+
+async def authenticate_user(session: Session, username: str, password: str) -> Optional[UserInDB]:
+    user = await run_in_threadpool(_get_user_by_username, session, username)
+    if not user:
         return None
+    verified, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not verified:
+        return None
+    if new_hash:
+        # Transparently rehash when the configured bcrypt cost has changed
+        user.hashed_password = new_hash
+        await run_in_threadpool(_save_user, session, user)
+        invalidate_principal(user.id)
     return user
 
 
+def access_token_claims(user: UserInDB) -> dict:
+    return {"sub": str(user.id)}
+
+
 def create_access_token(*, data: dict, expires_delta: timedelta):
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
     to_encode.update({"exp": expire})
+    from jose import jwt
+
     encoded_jwt = jwt.encode(to_encode, jwt_key, algorithm=jwt_alg)
     return encoded_jwt
 
@@ -79,7 +197,8 @@ def create_access_token(*, data: dict, expires_delta: timedelta):
 # Auth routes ========================================
 
 # POST /auth/registration
-@auth_router.post("/registration", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+@auth_router.post("/registration", response_model=UserResponse, status_code=status.HTTP_201_CREATED,
+                  dependencies=[Depends(rate_limit("registration")), Depends(password_hash_limiter)])
 def register_user(
         user: UserCreate,
         session: Session = Depends(get_session)
@@ -134,12 +253,13 @@ def register_user(
 
 
 # POST /auth/token
-@auth_router.post("/token", response_model=Token)
+@auth_router.post("/token", response_model=Token,
+                  dependencies=[Depends(rate_limit("login")), Depends(password_hash_limiter)])
 async def login_for_access_token(
         form_data: OAuth2PasswordRequestForm = Depends(),
         session: Session = Depends(get_session)
 ):
-    user = authenticate_user(session, form_data.username, form_data.password)
+    user = await authenticate_user(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -152,7 +272,7 @@ async def login_for_access_token(
 
     access_token_expires = timedelta(seconds=access_token_duration)
     access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+        data=access_token_claims(user), expires_delta=access_token_expires
     )
     return {
         "access_token": access_token,
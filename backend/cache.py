@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+import orjson
+
+
+class CacheBackend:
+    """Storage interface used by `ReadThroughCache`; implement it to plug in another store."""
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class TTLCache(CacheBackend):
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend(CacheBackend):
+    """Cache backend over a redis-py style client (`get`, `set(ex=)`, `delete`, `scan_iter`).
+
+    Values are stored as JSON, so datetimes come back as ISO strings; that is fine for
+    cached rows that are only ever re-serialized into responses.
+    """
+
+    def __init__(self, client, ttl: float = 60, prefix: str = "pony:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, key: Hashable) -> str:
+        return self.prefix + str(key)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        raw = self.client.get(self._key(key))
+        return default if raw is None else orjson.loads(raw)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_in = max(1, int(self.ttl if ttl is None else ttl))
+        self.client.set(self._key(key), orjson.dumps(value), ex=expires_in)
+
+    def delete(self, key: Hashable) -> None:
+        self.client.delete(self._key(key))
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class ReadThroughCache:
+    """Namespaced view of a backend that loads misses from the database and counts hits.
+
+    Lookups may pass a `version`, such as the ETag of the response being built. Entries are
+    then kept per version, so once the version moves on no worker serves the older entry.
+    """
+
+    def __init__(self, namespace: str, backend: CacheBackend):
+        self.namespace = namespace
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key(self, key: Hashable, version: Optional[str] = None) -> str:
+        if version is None:
+            return f"{self.namespace}:{key}"
+        return f"{self.namespace}:{key}@{version}"
+
+    def _count(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get(self, key: Hashable, load: Callable[[], Any], version: Optional[str] = None) -> Any:
+        """Cached value for `key`, calling `load` on a miss. `None` results are not cached."""
+        value = self.backend.get(self._key(key, version))
+        if value is not None:
+            self._count(1, 0)
+            return value
+        self._count(0, 1)
+        value = load()
+        if value is not None:
+            self.backend.set(self._key(key, version), value)
+        return value
+
+    def get_many(self, keys: Iterable[Hashable], load: Callable[[list], Dict[Hashable, Any]],
+                 version: Optional[str] = None) -> Dict[Hashable, Any]:
+        """Cached values for `keys`, loading every miss with a single `load(missing_keys)` call."""
+        found, missing = {}, []
+        for key in dict.fromkeys(keys):
+            value = self.backend.get(self._key(key, version))
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        self._count(len(found), len(missing))
+        if missing:
+            for key, value in load(missing).items():
+                self.backend.set(self._key(key, version), value)
+                found[key] = value
+        return found
+
+    def invalidate(self, key: Hashable) -> None:
+        self.backend.delete(self._key(key))
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
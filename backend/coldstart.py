@@ -0,0 +1,54 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from . import import_started
+from .metrics import Gauge, registry
+
+logger = logging.getLogger("backend.coldstart")
+
+# Seconds spent in each startup phase of this process: "import" (loading backend.main),
+# "schema" (migrate_database) and "first_invocation" (the first Lambda request)
+phases: dict = {}
+_first_invocation_lock = threading.Lock()
+_reported = False
+
+
+def mark(phase: str, started: float) -> None:
+    # Only the first occurrence counts; later lifespan replays are warm
+    phases.setdefault(phase, round(time.perf_counter() - started, 4))
+
+
+def mark_imported() -> None:
+    mark("import", import_started)
+
+
+@contextmanager
+def first_invocation():
+    """Time the first request handled by this process and log the cold-start report after it."""
+    global _reported
+    if _reported:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _first_invocation_lock:
+            if not _reported:
+                _reported = True
+                mark("first_invocation", started)
+                phases["total"] = round(time.perf_counter() - import_started, 4)
+                logger.info(json.dumps({"event": "cold_start", **phases}))
+
+
+def _cold_start_metrics():
+    gauge = Gauge("cold_start_seconds", "Time spent in each startup phase of this process.", ("phase",))
+    for phase, seconds in phases.items():
+        gauge.inc(seconds, phase=phase)
+    return [gauge]
+
+
+registry.collectors.append(_cold_start_metrics)
@@ -1,25 +1,115 @@
 import os
+import weakref
+from typing import Optional
 
-from sqlmodel import create_engine, Session, SQLModel
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlmodel import create_engine, Session
 
 # Check the environment variable
 if os.environ.get("DB_LOCATION") == "EFS":
-    db_path = "/mnt/efs/pony_express.db"
-    echo = False
+    default_url = "sqlite:////mnt/efs/pony_express.db"
+    default_echo = False
+    # WAL needs shared memory, which network filesystems such as EFS do not provide
+    default_wal = False
 else:
-    db_path = "pony_express.db"
-    echo = True
+    default_url = "sqlite:///pony_express.db"
+    default_echo = True
+    default_wal = True
 
-# Create the SQLite database engine
-engine = create_engine(
-    f"sqlite:///{db_path}",
-    echo=echo,
-    connect_args={"check_same_thread": False},
-)
+database_url = os.environ.get("DATABASE_URL", default_url)
+echo = os.environ.get("DB_ECHO", str(default_echo)).lower() == "true"
+sqlite_wal = os.environ.get("SQLITE_WAL", str(default_wal)).lower() == "true"
+pool_size = int(os.environ.get("DB_POOL_SIZE", 5))
+max_overflow = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+pool_timeout = int(os.environ.get("DB_POOL_TIMEOUT", 30))  # seconds
+pool_recycle = int(os.environ.get("DB_POOL_RECYCLE", 1800))  # seconds
 
+migrations_path = os.path.join(os.path.dirname(__file__), "migrations")
+# The newest revision in backend/migrations/versions. Keeping it here lets startup confirm an
+# up-to-date database with one query, without importing alembic (tests check it matches).
+schema_revision = "0006"
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+def _engine_options(url: str) -> dict:
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if url.database in (None, "", ":memory:"):
+            # In-memory databases are per connection and cannot be pooled
+            return options
+    else:
+        options = {"pool_pre_ping": True}
+    options.update(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+    )
+    return options
+
+
+def _configure_sqlite(engine: Engine, wal: bool) -> None:
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+
+def make_engine(url: str = database_url, **kwargs) -> Engine:
+    """Create a pooled engine for `url`, applying SQLite pragmas when needed."""
+    engine = create_engine(url, echo=echo, **{**_engine_options(url), **kwargs})
+    if engine.dialect.name == "sqlite":
+        _configure_sqlite(engine, wal=sqlite_wal)
+    return engine
+
+
+engine = make_engine()
+
+_ready_engines = weakref.WeakSet()
+
+
+def schema_is_current(target: Engine) -> bool:
+    """Whether the database is migrated to `schema_revision`; a single cheap query."""
+    try:
+        with target.connect() as connection:
+            return connection.scalar(text("SELECT version_num FROM alembic_version")) == schema_revision
+    except (OperationalError, ProgrammingError):
+        # Never migrated
+        return False
+
+
+def alembic_config(target: Optional[Engine] = None):
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", migrations_path)
+    config.set_main_option("sqlalchemy.url", (target or engine).url.render_as_string(hide_password=False))
+    return config
+
+
+def migrate_database(target: Optional[Engine] = None) -> None:
+    """Upgrade the database to the newest migration.
+
+    Runs at most once per engine per process: Mangum replays the lifespan on every Lambda
+    invocation, so warm invocations return immediately, and an up-to-date database costs
+    one query without importing alembic.
+    """
+    target = target or engine
+    if target in _ready_engines:
+        return
+    if not schema_is_current(target):
+        from alembic import command
+
+        config = alembic_config(target)
+        with target.begin() as connection:
+            config.attributes["connection"] = connection
+            command.upgrade(config, "head")
+    _ready_engines.add(target)
 
 
 def get_session():
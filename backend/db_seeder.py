@@ -1,145 +1,146 @@
 import json
+import logging
+import os
+import time
+from typing import Callable, Optional
 
-from sqlalchemy import func
+from sqlalchemy import Table, func, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlmodel import Session, create_engine, select
 
 from backend.schema import *
-from backend.database import engine
+from backend.database import engine, migrate_database
+from backend.lookups import clear_caches
+from backend.inbox import rebuild_inbox
+from backend.stats import reset_chat_stats
+from backend.versions import bump_all_versions
 
-SQLModel.metadata.create_all(engine)
+logger = logging.getLogger(__name__)
+
+batch_size = int(os.environ.get("SEED_BATCH_SIZE", 1000))
+# Stop a Lambda invocation with this much time left so the current batch can finish
+time_budget_margin = 10  # seconds
 
 local_engine = create_engine(
     "sqlite:///backend/initial.db",
     connect_args={"check_same_thread": False},
 )
 
-
-def upsert_all(session, cls, local_models) -> int:
-    models = session.exec(select(cls)).all()
-    model_lookup = {model.id: model for model in models}
-    count = 0
-    for local_model in local_models:
-        if model_lookup.get(local_model.id) is None:
-            session.add(cls(**{
-                key: value
-                for key, value in local_model.model_dump().items()
-                if key != "id"
-            }))
-            count += 1
-    session.commit()
-    return count
-
-
-def upsert_links(session, local_models) -> int:
-    links = session.exec(select(UserChatLinkInDB)).all()
-    link_lookup = {(link.user_id, link.chat_id): link for link in links}
-    count = 0
-    for local_model in local_models:
-        if link_lookup.get((local_model.user_id, local_model.chat_id)) is None:
-            session.add(UserChatLinkInDB(**local_model.model_dump()))
-            count += 1
-    session.commit()
-    return count
-
-
-def get_count(session, model):
-    if model == UserChatLinkInDB:
-        return session.scalar(select(func.count(model.user_id)))
-    return session.scalar(select(func.count(model.id)))
-
-
-def add_users() -> dict[str, int]:
-    with Session(local_engine) as local_session:
-        users = local_session.exec(select(UserInDB)).all()
-        local_count = len(users)
-
-    with Session(engine) as session:
-        prev_count = get_count(session, UserInDB)
-        additions = upsert_all(session, UserInDB, users)
-        count = get_count(session, UserInDB)
-
-    return {
-        "local": local_count,
-        "prev": prev_count,
-        "additions": additions,
-        "final": count,
-    }
-
-
-def add_chats() -> dict[str, int]:
-    with Session(local_engine) as local_session:
-        chats = local_session.exec(select(ChatInDB)).all()
-        local_count = len(chats)
-
-    with Session(engine) as session:
-        prev_count = get_count(session, ChatInDB)
-        additions = upsert_all(session, ChatInDB, chats)
-        count = get_count(session, ChatInDB)
-
-    return {
-        "local": local_count,
-        "prev": prev_count,
-        "additions": additions,
-        "final": count,
-    }
-
-
-def add_messages() -> dict[str, int]:
-    with Session(local_engine) as local_session:
-        messages = local_session.exec(select(MessageInDB)).all()
-        local_count = len(messages)
-
+# Parents before children so foreign keys always resolve
+tables: list[Table] = [
+    UserInDB.__table__,
+    ChatInDB.__table__,
+    MessageInDB.__table__,
+    UserChatLinkInDB.__table__,
+]
+
+
+def insert_ignoring_conflicts(table: Table):
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return sqlite.insert(table).on_conflict_do_nothing()
+
+
+def get_count(connection, table: Table) -> int:
+    return connection.scalar(select(func.count()).select_from(table))
+
+
+def copy_table(table: Table, after: Optional[list] = None, out_of_time: Callable[[], bool] = lambda: False) -> dict:
+    """Stream `table` from initial.db into the target in batches, keeping ids.
+
+    Rows are read in primary key order starting after the `after` key, so a copy that
+    stopped early can resume. Returns row counts plus the last key copied.
+    """
+    key = tuple_(*table.primary_key.columns)
+    query = select(table).order_by(*table.primary_key.columns)
+    if after is not None:
+        query = query.where(key > tuple_(*after))
+
+    stats = {"read": 0, "inserted": 0, "last_key": after, "complete": True}
+    start = time.perf_counter()
+    with local_engine.connect() as local_connection, engine.connect() as connection:
+        stats["prev"] = get_count(connection, table)
+        rows = local_connection.execution_options(yield_per=batch_size).execute(query)
+        for batch in rows.partitions():
+            result = connection.execute(insert_ignoring_conflicts(table), [row._asdict() for row in batch])
+            connection.commit()
+            stats["read"] += len(batch)
+            stats["inserted"] += max(result.rowcount, 0)
+            stats["last_key"] = [getattr(batch[-1], column.name) for column in table.primary_key.columns]
+
+            elapsed = time.perf_counter() - start
+            logger.info("%s: %d rows copied (%.0f rows/s)", table.name, stats["read"], stats["read"] / elapsed)
+            if out_of_time():
+                stats["complete"] = False
+                break
+        rows.close()
+        stats["final"] = get_count(connection, table)
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    stats["rows_per_second"] = round(stats["read"] / stats["seconds"]) if stats["seconds"] else stats["read"]
+    return stats
+
+
+def reset_sequences() -> None:
+    # Explicit ids do not advance PostgreSQL sequences; move them past the copied rows
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as connection:
+        for table in tables:
+            if "id" in table.columns:
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+                ))
+
+
+def seed_database(checkpoint: Optional[dict] = None, deadline: Optional[float] = None) -> dict:
+    """Copy every table from initial.db, optionally resuming from a checkpoint.
+
+    `deadline` is a `time.monotonic()` value; when it is reached the copy stops after the
+    current batch and the result carries the checkpoint to pass to the next call.
+    """
+    migrate_database(engine)
+
+    def out_of_time() -> bool:
+        return deadline is not None and time.monotonic() >= deadline
+
+    result = {"tables": {}, "complete": False, "checkpoint": None}
+    names = [table.name for table in tables]
+    start_index = names.index(checkpoint["table"]) if checkpoint else 0
+    for index, table in enumerate(tables[start_index:], start=start_index):
+        after = checkpoint["after"] if checkpoint and index == start_index else None
+        stats = copy_table(table, after=after, out_of_time=out_of_time)
+        result["tables"][table.name] = stats
+        if not stats["complete"]:
+            result["checkpoint"] = {"table": table.name, "after": stats["last_key"]}
+            return result
+        if out_of_time() and index + 1 < len(tables):
+            result["checkpoint"] = {"table": tables[index + 1].name, "after": None}
+            return result
+
+    reset_sequences()
     with Session(engine) as session:
-        prev_count = get_count(session, MessageInDB)
-        additions = upsert_all(session, MessageInDB, messages)
-        count = get_count(session, MessageInDB)
-
-    return {
-        "local": local_count,
-        "prev": prev_count,
-        "additions": additions,
-        "final": count,
-    }
-
-
-def add_user_chat_links() -> dict[str, int]:
-    with Session(local_engine) as local_session:
-        links = local_session.exec(select(UserChatLinkInDB)).all()
-        local_count = len(links)
-
-    with Session(engine) as session:
-        prev_count = get_count(session, UserChatLinkInDB)
-        additions = upsert_links(session, links)
-        count = get_count(session, UserChatLinkInDB)
-
-    return {
-        "local": local_count,
-        "prev": prev_count,
-        "additions": additions,
-        "final": count,
-    }
-
-
-def seed_database():
-    user_count = add_users()
-    chat_count = add_chats()
-    message_count = add_messages()
-    link_count = add_user_chat_links()
-
-    return {
-        "user_count": user_count,
-        "chat_count": chat_count,
-        "message_count": message_count,
-        "link_count": link_count,
-    }
+        reset_chat_stats(session)
+        rebuild_inbox(session)
+        bump_all_versions(session)
+    # Members and profiles changed underneath the caches; with Redis this clears every worker's
+    clear_caches()
+    result["complete"] = True
+    return result
 
 
 def lambda_handler(event, context):
+    # Invoke again with {"checkpoint": <body.checkpoint>} until body.complete is true
     try:
-        result = seed_database()
+        deadline = None
+        if context is not None:
+            remaining = context.get_remaining_time_in_millis() / 1000
+            deadline = time.monotonic() + remaining - time_budget_margin
+        result = seed_database(checkpoint=(event or {}).get("checkpoint"), deadline=deadline)
         return {
             "statusCode": 200,
-            "body": json.dumps(result),
+            "body": json.dumps(result, default=str),
         }
     except Exception as e:
         return {
@@ -149,4 +150,5 @@ def lambda_handler(event, context):
 
 
 if __name__ == "__main__":
-    seed_database()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(json.dumps(seed_database(), indent=2, default=str))
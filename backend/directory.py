@@ -0,0 +1,81 @@
+from typing import List, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlmodel import Session, select
+
+from .schema import UserInDB
+from .serialization import select_users
+
+# Matches ix_users_email_lower; email prefixes are compared in lower case
+email_key = func.lower(UserInDB.email)
+
+
+def _successor(character: str) -> Optional[str]:
+    # The next code point a string can contain, skipping the surrogates
+    code = ord(character) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return chr(code) if code <= 0x10FFFF else None
+
+
+def prefix_match(expression, prefix: str):
+    """`expression LIKE 'prefix%'` as a range, which a B-tree index on `expression` can serve.
+
+    SQLite only uses an index for LIKE under PRAGMA case_sensitive_like, and PostgreSQL only
+    with a pattern_ops index, but both use one for a range between the prefix and its successor.
+    The range only equals "starts with" when strings compare by code point, as SQLite's BINARY
+    collation does; on PostgreSQL pass the expression through `code_point_order` first.
+    """
+    successor = _successor(prefix[-1])
+    if successor is None:
+        return expression >= prefix
+    return and_(expression >= prefix, expression < prefix[:-1] + successor)
+
+
+def code_point_order(session: Session, expression):
+    """`expression` under the "C" collation on PostgreSQL, served by the ix_*_c indexes."""
+    if session.get_bind().dialect.name == "postgresql":
+        return expression.collate("C")
+    return expression
+
+
+def _matches(session: Session, q: str):
+    return or_(
+        prefix_match(code_point_order(session, UserInDB.username), q),
+        prefix_match(code_point_order(session, email_key), q.lower()),
+    )
+
+
+def list_users(session: Session, limit: int, after: Optional[str] = None, q: Optional[str] = None) -> list:
+    """Public user columns ordered by username, starting after the username `after`.
+
+    With `q`, only users whose username starts with `q` or whose email starts with it in any
+    case. Returns up to `limit + 1` rows so the caller can tell whether another page exists.
+    """
+    query = select_users()
+    if q:
+        query = query.where(_matches(session, q))
+    if after is not None:
+        query = query.where(UserInDB.username > after)
+    return session.exec(query.order_by(UserInDB.username).limit(limit + 1)).all()
+
+
+def typeahead_users(session: Session, q: str, limit: int) -> List[dict]:
+    """Up to `limit` users matching the prefix `q`, username matches first.
+
+    Each lookup reads at most `limit` entries from one index, whatever the size of the table,
+    and the email index is only consulted when usernames do not fill the list.
+    """
+    columns = (UserInDB.id, UserInDB.username)
+    username = code_point_order(session, UserInDB.username)
+    rows = session.exec(
+        select(*columns).where(prefix_match(username, q)).order_by(username).limit(limit)
+    ).all()
+    if len(rows) < limit:
+        seen = {row[0] for row in rows}
+        email = code_point_order(session, email_key)
+        by_email = session.exec(
+            select(*columns).where(prefix_match(email, q.lower())).order_by(email).limit(limit)
+        ).all()
+        rows += [row for row in by_email if row[0] not in seen][:limit - len(rows)]
+    return [{"id": row[0], "username": row[1]} for row in rows]
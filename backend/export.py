@@ -0,0 +1,67 @@
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+
+import orjson
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from .schema import MessageInDB
+from .serialization import message_row, select_messages
+
+# Rows fetched from the database cursor, and encoded into one chunk of the response, at a time
+export_batch_size = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+
+media_types = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+csv_header = ["id", "chat_id", "created_at", "user_id", "username", "text"]
+
+
+def _ndjson_chunk(rows) -> bytes:
+    return b"".join(orjson.dumps(message_row(row)) + b"\n" for row in rows)
+
+
+def _csv_chunk(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows((row[0], row[2], row[3] and row[3].isoformat(), row[4], row[5], row[1]) for row in rows)
+    return buffer.getvalue().encode()
+
+
+def export_messages(engine: Engine, chat_id: int, format: str = "ndjson", since: Optional[datetime] = None,
+                    until: Optional[datetime] = None) -> Iterator[bytes]:
+    """Yield a chat's messages, oldest first, encoded as NDJSON lines or CSV rows.
+
+    Rows are streamed from the database cursor `export_batch_size` at a time, so memory use does
+    not depend on the size of the chat. The generator opens its own session, since the request's
+    is closed before a streaming response is sent.
+    """
+    query = select_messages().where(MessageInDB.chat_id == chat_id)
+    if since is not None:
+        query = query.where(MessageInDB.created_at >= since)
+    if until is not None:
+        query = query.where(MessageInDB.created_at < until)
+    query = query.order_by(MessageInDB.created_at, MessageInDB.id)
+
+    encode = _ndjson_chunk if format == "ndjson" else _csv_chunk
+    if format == "csv":
+        yield (",".join(csv_header) + "\r\n").encode()
+    with Session(engine) as session:
+        result = session.exec(query.execution_options(yield_per=export_batch_size))
+        for rows in result.partitions():
+            yield encode(rows)
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compress a stream of chunks into a single gzip member as it goes."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
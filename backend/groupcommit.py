@@ -0,0 +1,152 @@
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from .inbox import record_inbox_message
+from .metrics import Counter, Histogram, registry
+from .schema import MessageInDB
+from .stats import record_message
+from .versions import bump_version
+
+group_commit = os.environ.get("GROUP_COMMIT", "false").lower() == "true"
+commit_interval = float(os.environ.get("GROUP_COMMIT_INTERVAL_MS", 5)) / 1000  # seconds
+max_batch_size = int(os.environ.get("GROUP_COMMIT_MAX_BATCH", 256))
+submit_timeout = float(os.environ.get("GROUP_COMMIT_TIMEOUT", 30))  # seconds
+
+batch_size_buckets = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+batch_sizes = registry.register(Histogram(
+    "group_commit_batch_size", "Messages written per group commit.", (), batch_size_buckets))
+batch_failures = registry.register(Counter(
+    "group_commit_failures_total", "Group commits that failed and were retried one message at a time."))
+
+
+class PendingMessage(NamedTuple):
+    chat_id: int
+    user_id: int
+    text: str
+    created_at: datetime
+    future: Future
+
+
+class GroupCommitWriter:
+    """Single writer thread that commits queued message inserts together.
+
+    Each commit on SQLite takes the database write lock and syncs the journal, so concurrent
+    posters queue up on the lock one fsync at a time. The writer instead collects whatever
+    arrives within `interval` seconds (or `max_batch` messages), inserts it in one transaction
+    and resolves each caller's future with the new message id. A batch that fails is retried
+    one message at a time so a bad row only fails its own request.
+    """
+
+    def __init__(self, engine: Engine, interval: float = commit_interval, max_batch: int = max_batch_size):
+        self.engine = engine
+        self.interval = interval
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Optional[PendingMessage]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, chat_id: int, user_id: int, text: str, created_at: datetime) -> "Future[int]":
+        future: "Future[int]" = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+            self._queue.put(PendingMessage(chat_id, user_id, text, created_at, future))
+        return future
+
+    def close(self) -> None:
+        """Write everything queued so far and stop the thread; `submit` starts a new one."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch: List[PendingMessage]) -> None:
+        try:
+            with Session(self.engine) as session:
+                ids = self._write(session, batch)
+                session.commit()
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0].future.set_exception(e)
+                return
+            batch_failures.inc()
+            for item in batch:
+                self._commit([item])
+            return
+        batch_sizes.observe(len(batch))
+        for item, message_id in zip(batch, ids):
+            item.future.set_result(message_id)
+
+    @staticmethod
+    def _write(session: Session, batch: List[PendingMessage]) -> List[int]:
+        by_chat: Dict[int, List[PendingMessage]] = defaultdict(list)
+        for item in batch:
+            by_chat[item.chat_id].append(item)
+        for chat_id, items in by_chat.items():
+            record_message(session, chat_id, max(item.created_at for item in items), count=len(items))
+            bump_version(session, "chat", chat_id)
+        rows = [
+            {"text": item.text, "chat_id": item.chat_id, "user_id": item.user_id, "created_at": item.created_at}
+            for item in batch
+        ]
+        ids = session.exec(
+            insert(MessageInDB).returning(MessageInDB.id, sort_by_parameter_order=True), params=rows
+        ).scalars().all()
+        # One at a time, in order, so unread counts come out as if each message was posted alone
+        for item, message_id in zip(batch, ids):
+            record_inbox_message(session, item.chat_id, message_id, item.user_id, item.text, item.created_at)
+        return ids
+
+
+_writers: Dict[Engine, GroupCommitWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(engine: Engine) -> GroupCommitWriter:
+    with _writers_lock:
+        writer = _writers.get(engine)
+        if writer is None:
+            writer = _writers[engine] = GroupCommitWriter(engine)
+        return writer
+
+
+def close_writers() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
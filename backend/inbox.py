@@ -0,0 +1,147 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import and_, case, delete, exists, func, literal, true
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from .schema import ChatInDB, InboxEntryInDB, MessageInDB, UserChatLinkInDB
+
+preview_length = 100
+# Activity time for chats without messages or a creation time, so they sort last
+epoch = datetime(1970, 1, 1)
+
+inbox_entries = InboxEntryInDB.__table__
+inbox_columns = ["user_id", "chat_id", "last_activity_at", "last_message_id", "last_message_user_id",
+                 "last_message_preview", "unread_count", "last_read_message_id"]
+
+
+def _upsert(session: Session, rows, updates) -> None:
+    # INSERT ... SELECT that overwrites existing entries, except for the columns `updates` computes
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(inbox_entries).from_select(inbox_columns, rows)
+    set_ = {column: statement.excluded[column] for column in inbox_columns[2:]}
+    set_.update(updates(statement.excluded))
+    session.connection().execute(statement.on_conflict_do_update(index_elements=["user_id", "chat_id"], set_=set_))
+
+
+def record_inbox_message(session: Session, chat_id: int, message_id: int, author_id: int, text: str,
+                         created_at: datetime, count: int = 1) -> None:
+    """Move the chat to the top of every member's inbox in the caller's transaction.
+
+    `message_id` is the newest of the `count` messages just added. Members without an entry
+    yet (e.g. added by the seeder) get one, so the inbox heals itself on the next message.
+    """
+    is_author = UserChatLinkInDB.user_id == author_id
+    members = select(
+        UserChatLinkInDB.user_id,
+        UserChatLinkInDB.chat_id,
+        literal(created_at, inbox_entries.c.last_activity_at.type),
+        literal(message_id),
+        literal(author_id),
+        literal(text[:preview_length]),
+        case((is_author, 0), else_=count),
+        case((is_author, message_id), else_=None),
+    ).where(UserChatLinkInDB.chat_id == chat_id)
+    # Posting in a chat implies having read it
+    _upsert(session, members, lambda excluded: {
+        "unread_count": case((excluded.user_id == author_id, 0), else_=inbox_entries.c.unread_count + count),
+        "last_read_message_id": case(
+            (excluded.user_id == author_id, message_id), else_=inbox_entries.c.last_read_message_id
+        ),
+    })
+
+
+def _refresh_entries(session: Session, *conditions) -> None:
+    # Recompute the entries of the memberships matching `conditions`, keeping read watermarks
+    current = inbox_entries.alias("current")
+    last_message_id = (
+        select(func.max(MessageInDB.id))
+        .where(MessageInDB.chat_id == UserChatLinkInDB.chat_id)
+        .correlate(UserChatLinkInDB)
+        .scalar_subquery()
+    )
+    unread_count = (
+        select(func.count(MessageInDB.id))
+        .where(
+            MessageInDB.chat_id == UserChatLinkInDB.chat_id,
+            MessageInDB.id > func.coalesce(current.c.last_read_message_id, 0),
+            MessageInDB.user_id != UserChatLinkInDB.user_id,
+        )
+        .correlate(UserChatLinkInDB, current)
+        .scalar_subquery()
+    )
+    entries = (
+        select(
+            UserChatLinkInDB.user_id,
+            UserChatLinkInDB.chat_id,
+            func.coalesce(MessageInDB.created_at, ChatInDB.created_at, epoch),
+            MessageInDB.id,
+            MessageInDB.user_id,
+            func.substr(MessageInDB.text, 1, preview_length),
+            unread_count,
+            current.c.last_read_message_id,
+        )
+        .join(ChatInDB, ChatInDB.id == UserChatLinkInDB.chat_id)
+        .outerjoin(MessageInDB, MessageInDB.id == last_message_id)
+        .outerjoin(current, and_(
+            current.c.user_id == UserChatLinkInDB.user_id, current.c.chat_id == UserChatLinkInDB.chat_id
+        ))
+        # SQLite needs a WHERE clause to tell the SELECT apart from the ON CONFLICT clause
+        .where(*conditions or [true()])
+    )
+    _upsert(session, entries, lambda excluded: {})
+
+
+def rebuild_inbox(session: Session) -> None:
+    """Recompute every member's inbox entry from the chats, their messages and the read watermarks.
+
+    Run it after bulk imports that bypassed the API.
+    """
+    membership = exists().where(
+        UserChatLinkInDB.user_id == inbox_entries.c.user_id, UserChatLinkInDB.chat_id == inbox_entries.c.chat_id
+    )
+    session.exec(delete(inbox_entries).where(~membership))
+    _refresh_entries(session)
+    session.commit()
+
+
+def mark_read(session: Session, user_id: int, chat_id: int,
+              message_id: Optional[int] = None) -> Optional[InboxEntryInDB]:
+    """Move the user's read watermark in a chat forward to `message_id`, or to the newest message.
+
+    Returns the entry, or `None` if the user is not a member of the chat. Reading up to the
+    newest message needs no counting; an older watermark only counts the messages after it.
+    """
+    entry = session.get(InboxEntryInDB, (user_id, chat_id))
+    if entry is None:
+        _refresh_entries(session, UserChatLinkInDB.user_id == user_id, UserChatLinkInDB.chat_id == chat_id)
+        entry = session.get(InboxEntryInDB, (user_id, chat_id))
+        if entry is None:
+            return None
+
+    newest = session.exec(select(func.max(MessageInDB.id)).where(MessageInDB.chat_id == chat_id)).one()
+    if newest is None:
+        return entry
+    watermark = newest if message_id is None else min(message_id, newest)
+    if entry.last_read_message_id is not None and watermark <= entry.last_read_message_id:
+        return entry
+
+    if watermark == newest:
+        entry.unread_count = 0
+    else:
+        entry.unread_count = session.exec(
+            select(func.count(MessageInDB.id)).where(
+                MessageInDB.chat_id == chat_id, MessageInDB.id > watermark, MessageInDB.user_id != user_id
+            )
+        ).one()
+    entry.last_read_message_id = watermark
+    session.add(entry)
+    return entry
+
+
+def get_read_receipts(session: Session, chat_id: int) -> List[InboxEntryInDB]:
+    """Every member's entry for the chat, to show how far each of them has read."""
+    return session.exec(
+        select(InboxEntryInDB).where(InboxEntryInDB.chat_id == chat_id).order_by(InboxEntryInDB.user_id)
+    ).all()
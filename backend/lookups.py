@@ -0,0 +1,141 @@
+import os
+from typing import Dict, Iterable, List, Optional
+
+from sqlmodel import Session, select
+
+from .cache import CacheBackend, ReadThroughCache, RedisBackend, TTLCache
+from .metrics import Counter, registry
+from .schema import ChatInDB, UserChatLinkInDB, UserInDB
+from .serialization import select_users, user_row
+
+# Rarely-changing reads served from a cache. Writes made through this process invalidate
+# their entries immediately; other workers see them once `cache_ttl` has passed. Routes that
+# answer with an ETag pass it as `version`, so their bodies always match the ETag.
+cache_ttl = int(os.environ.get("CACHE_TTL", 60))  # seconds
+cache_size = int(os.environ.get("CACHE_SIZE", 10000))
+redis_url = os.environ.get("REDIS_URL")
+
+
+def make_cache_backend() -> CacheBackend:
+    if redis_url:
+        import redis  # optional dependency, only needed when REDIS_URL is set
+
+        return RedisBackend(redis.Redis.from_url(redis_url), ttl=cache_ttl)
+    return TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+
+cache_backend = make_cache_backend()
+
+profile_cache = ReadThroughCache("user", cache_backend)
+chat_cache = ReadThroughCache("chat", cache_backend)
+chat_members_cache = ReadThroughCache("chat_members", cache_backend)
+user_chats_cache = ReadThroughCache("user_chats", cache_backend)
+
+caches = [profile_cache, chat_cache, chat_members_cache, user_chats_cache]
+
+
+def _load_profiles(session: Session, user_ids: list) -> Dict[int, dict]:
+    rows = session.exec(select_users().where(UserInDB.id.in_(user_ids)))
+    return {row[0]: user_row(row) for row in rows}
+
+
+def _load_chats(session: Session, chat_ids: list) -> Dict[int, dict]:
+    rows = session.exec(
+        select(ChatInDB.id, ChatInDB.name, ChatInDB.owner_id, ChatInDB.created_at).where(ChatInDB.id.in_(chat_ids))
+    )
+    return {row[0]: {"id": row[0], "name": row[1], "owner_id": row[2], "created_at": row[3]} for row in rows}
+
+
+def get_profiles(session: Session, user_ids: Iterable[int], version: Optional[str] = None) -> Dict[int, dict]:
+    """Public profiles keyed by user id; ids that do not exist are left out."""
+    return profile_cache.get_many(user_ids, lambda missing: _load_profiles(session, missing), version)
+
+
+def get_profile(session: Session, user_id: int, version: Optional[str] = None) -> Optional[dict]:
+    return get_profiles(session, [user_id], version).get(user_id)
+
+
+def _get_chat_records(session: Session, chat_ids: Iterable[int], version: Optional[str] = None) -> Dict[int, dict]:
+    return chat_cache.get_many(chat_ids, lambda missing: _load_chats(session, missing), version)
+
+
+def _with_owners(records: Iterable[dict], profiles: Dict[int, dict]) -> List[dict]:
+    return [
+        {"id": record["id"], "name": record["name"], "owner": profiles[record["owner_id"]],
+         "created_at": record["created_at"]}
+        for record in records
+    ]
+
+
+def get_chat_names(session: Session, chat_ids: Iterable[int]) -> Dict[int, str]:
+    """Names keyed by chat id; ids that do not exist are left out."""
+    return {chat_id: record["name"] for chat_id, record in _get_chat_records(session, chat_ids).items()}
+
+
+def chat_exists(session: Session, chat_id: int, version: Optional[str] = None) -> bool:
+    return chat_id in _get_chat_records(session, [chat_id], version)
+
+
+def get_chat(session: Session, chat_id: int, version: Optional[str] = None) -> Optional[dict]:
+    """The chat with its owner's profile, or `None` if it does not exist."""
+    record = _get_chat_records(session, [chat_id], version).get(chat_id)
+    if record is None:
+        return None
+    return _with_owners([record], get_profiles(session, [record["owner_id"]], version))[0]
+
+
+def get_user_chats(session: Session, user_id: int) -> Optional[List[dict]]:
+    """Chats the user belongs to, or `None` if the user does not exist."""
+    chat_ids = get_user_chat_ids(session, user_id)
+    records = _get_chat_records(session, chat_ids)
+    # The user's own profile is fetched alongside the owners so the lookup stays one query
+    profiles = get_profiles(session, [user_id, *(record["owner_id"] for record in records.values())])
+    if user_id not in profiles:
+        return None
+    return _with_owners((records[chat_id] for chat_id in chat_ids if chat_id in records), profiles)
+
+
+def get_chat_member_ids(session: Session, chat_id: int, version: Optional[str] = None) -> List[int]:
+    return chat_members_cache.get(chat_id, lambda: list(session.exec(
+        select(UserChatLinkInDB.user_id).where(UserChatLinkInDB.chat_id == chat_id).order_by(UserChatLinkInDB.user_id)
+    )), version)
+
+
+def get_user_chat_ids(session: Session, user_id: int) -> List[int]:
+    return user_chats_cache.get(user_id, lambda: list(session.exec(
+        select(UserChatLinkInDB.chat_id).where(UserChatLinkInDB.user_id == user_id).order_by(UserChatLinkInDB.chat_id)
+    )))
+
+
+def get_chat_members(session: Session, chat_id: int, version: Optional[str] = None) -> List[dict]:
+    member_ids = get_chat_member_ids(session, chat_id, version)
+    profiles = get_profiles(session, member_ids, version)
+    return [profiles[user_id] for user_id in member_ids if user_id in profiles]
+
+
+def invalidate_chat(chat_id: int) -> None:
+    chat_cache.invalidate(chat_id)
+
+
+def invalidate_user(user_id: int) -> None:
+    profile_cache.invalidate(user_id)
+
+
+def clear_caches() -> None:
+    cache_backend.clear()
+
+
+def cache_stats() -> dict:
+    return {cache.namespace: cache.stats() for cache in caches}
+
+
+def _cache_metrics():
+    hits = Counter("cache_hits_total", "Read-through cache lookups served from the cache.", ("cache",))
+    misses = Counter("cache_misses_total", "Read-through cache lookups loaded from the database.", ("cache",))
+    for cache in caches:
+        hits.inc(cache.hits, cache=cache.namespace)
+        misses.inc(cache.misses, cache=cache.namespace)
+    return [hits, misses]
+
+
+registry.collectors.append(_cache_metrics)
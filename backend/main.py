@@ -1,24 +1,56 @@
+import asyncio
+import json
+import os
+import time
+
+import anyio
 from mangum import Mangum
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from fastapi import FastAPI, HTTPException, status, Depends, Body, Query
+from fastapi import FastAPI, HTTPException, status, Depends, Body, Query, Request, Response, WebSocket, \
+    WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import ValidationError
+from sqlalchemy import and_, func, insert, tuple_
 from sqlalchemy.orm import joinedload
 from sqlmodel import select, Session
 
-from .auth import get_current_user, UserUpdate, auth_router
-from .database import create_db_and_tables, get_session
-from .models import UserPublic, ChatPublic, MessagePublic, MessageCreate, UsersResponse, Meta, UserBase, UserResponse, \
-    ChatsResponse, ChatsMeta, MessagesResponse, ChatResponse, MessageResponse
-from .schema import UserInDB, ChatInDB, MessageInDB
+from . import coldstart, groupcommit, lookups
+from .auth import credentials_exception, current_user_key, get_current_user, get_current_user_id, \
+    invalidate_principal, UserUpdate, auth_router
+from .database import migrate_database, get_session
+from .directory import list_users, typeahead_users
+from .export import export_messages, gzip_chunks, media_types
+from .inbox import get_read_receipts, mark_read, record_inbox_message
+from .models import UserPublic, ChatPublic, MessagePublic, MessageCreate, UsersResponse, UserBase, UserResponse, \
+    ChatsResponse, MessagesResponse, ChatResponse, InboxResponse, Meta, ReadMarker, ReadReceipt, \
+    ReadReceiptsResponse, ReadState, ReadStateResponse, UnreadMeta, UnreadResponse, MessageResponse, \
+    MessageSearchResponse, SearchMeta, BatchError, MessageBatchMeta, MessageBatchResponse, SyncMeta, SyncResponse, \
+    TypeaheadResponse
+from .metrics import MetricsMiddleware, registry
+from .pagination import DEFAULT_PAGE_SIZE, MAX_BATCH_SIZE, MAX_PAGE_SIZE, SYNC_OVERLAP, SYNC_PAGE_SIZE, TYPEAHEAD_LIMIT, \
+    decode_cursor, decode_key_cursor, encode_cursor, encode_key_cursor
+from .ratelimit import ConcurrencyLimiter, charge, rate_limit
+from .realtime import ChatHub, get_hub, heartbeat_interval
+from .serialization import chat_row, json_response, message_row, select_chats, select_messages, \
+    user_row
+from .schema import UserInDB, ChatInDB, MessageInDB, UserChatLinkInDB, EntityVersionInDB, InboxEntryInDB
+from .search import search_messages
+from .stats import get_chat_stats, record_message
+from .versions import ALL_USERS, bump_version, conditional_response
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    started = time.perf_counter()
+    migrate_database()
+    coldstart.mark("schema", started)
     yield
+    groupcommit.close_writers()
 
 
 app = FastAPI(
@@ -36,6 +68,15 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+app.add_middleware(MetricsMiddleware)
+
+# Writes beyond this many at once wait for a slot; beyond the queue depth they are shed with a 503
+message_limiter = ConcurrencyLimiter(
+    "messages",
+    limit=int(os.environ.get("MESSAGE_CONCURRENCY", 32)),
+    max_queue=int(os.environ.get("MESSAGE_QUEUE_DEPTH", 128)),
+)
+
 app.include_router(auth_router)
 
 
@@ -45,20 +86,194 @@ app.include_router(auth_router)
 @app.get("/users/me", tags=["Users"], summary="Get the current user",
          description="Returns the current user",
          response_model=UserResponse)
-async def get_current_user_route(current_user: UserInDB = Depends(get_current_user)):
-    if not current_user:
+def get_current_user_route(
+        request: Request,
+        response: Response,
+        current_user: UserInDB = Depends(get_current_user),
+        session: Session = Depends(get_session)
+):
+    if not_modified := conditional_response(request, response, session, ("user", current_user.id)):
+        return not_modified
+    # The principal may be cached by another worker's TTL; the body has to match the ETag
+    user = lookups.get_profile(session, current_user.id, response.headers.get("ETag"))
+    if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return UserResponse(user=UserPublic.from_orm(current_user))
+    return json_response({"user": user}, response)
+
+
+# GET /users/me/inbox
+@app.get("/users/me/inbox", tags=["Users"], summary="Get the current user's inbox",
+         description="Returns the current user's chats, most recently active first, each with a preview of its "
+                     "last message and the number of messages others have posted since the user last read or "
+                     "posted there. Pass `meta.next_cursor` as `before` to fetch the next page.",
+         response_model=InboxResponse)
+def get_current_user_inbox(
+        response: Response,
+        before: Optional[str] = Query(None, description="Return chats last active before this cursor"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        current_user_id: int = Depends(get_current_user_id),
+        session: Session = Depends(get_session)
+):
+    # One range scan of the (user_id, last_activity_at, chat_id) index
+    query = select(InboxEntryInDB).where(InboxEntryInDB.user_id == current_user_id)
+    if before:
+        position = tuple_(InboxEntryInDB.last_activity_at, InboxEntryInDB.chat_id)
+        query = query.where(position < tuple_(*decode_cursor(before)))
+    query = query.order_by(InboxEntryInDB.last_activity_at.desc(), InboxEntryInDB.chat_id.desc()).limit(limit + 1)
+    entries = session.exec(query).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    chat_names = lookups.get_chat_names(session, [entry.chat_id for entry in entries])
+    authors = lookups.get_profiles(session, {entry.last_message_user_id for entry in entries
+                                             if entry.last_message_id is not None})
+    result = []
+    for entry in entries:
+        if entry.chat_id not in chat_names:
+            continue
+        last_message = None
+        if entry.last_message_id is not None and entry.last_message_user_id in authors:
+            last_message = {
+                "id": entry.last_message_id,
+                "text": entry.last_message_preview,
+                "user": authors[entry.last_message_user_id],
+                "created_at": entry.last_activity_at
+            }
+        result.append({
+            "chat_id": entry.chat_id,
+            "chat_name": chat_names[entry.chat_id],
+            "last_activity_at": entry.last_activity_at,
+            "unread_count": entry.unread_count,
+            "last_read_message_id": entry.last_read_message_id,
+            "last_message": last_message
+        })
+
+    meta = {"count": len(result), "next_cursor": None}
+    if has_more:
+        meta["next_cursor"] = encode_cursor(entries[-1].last_activity_at, entries[-1].chat_id)
+
+    return json_response({"meta": meta, "entries": result}, response)
+
+
+# GET /users/me/unread
+@app.get("/users/me/unread", tags=["Users"], summary="Get the current user's unread counts",
+         description="Returns the number of unread messages in each of the current user's chats that has any, "
+                     "and their total, for unread badges.",
+         response_model=UnreadResponse)
+def get_current_user_unread(
+        current_user_id: int = Depends(get_current_user_id),
+        session: Session = Depends(get_session)
+):
+    # Maintained counters, read with one range of the (user_id, chat_id) primary key
+    rows = session.exec(
+        select(InboxEntryInDB.chat_id, InboxEntryInDB.last_read_message_id, InboxEntryInDB.unread_count)
+        .where(InboxEntryInDB.user_id == current_user_id, InboxEntryInDB.unread_count > 0)
+        .order_by(InboxEntryInDB.chat_id)
+    ).all()
+    chats = [
+        ReadState(chat_id=chat_id, last_read_message_id=last_read_message_id, unread_count=unread_count)
+        for chat_id, last_read_message_id, unread_count in rows
+    ]
+    return UnreadResponse(meta=UnreadMeta(count=len(chats), total=sum(chat.unread_count for chat in chats)),
+                          chats=chats)
+
+
+# GET /users/me/sync
+@app.get("/users/me/sync", tags=["Users"], summary="Sync changes across the current user's chats",
+         description="Returns the current user's chat memberships, the chats created or changed and the messages "
+                     "posted since `since` across all of their chats. Without `since` only memberships, chats and "
+                     "a starting watermark are returned. Pass `meta.watermark` as `since` on the next call; keep "
+                     "calling while `meta.has_more` is true. Messages posted shortly before `since` may be returned "
+                     "again, so clients should de-duplicate them by id.",
+         response_model=SyncResponse)
+def sync_current_user(
+        since: Optional[str] = Query(None, description="Watermark from a previous sync"),
+        limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=SYNC_PAGE_SIZE),
+        current_user_id: int = Depends(get_current_user_id),
+        session: Session = Depends(get_session)
+):
+    synced_at = datetime.utcnow()
+    membership = select(UserChatLinkInDB.chat_id).where(UserChatLinkInDB.user_id == current_user_id)
+    chat_ids = session.exec(membership).all()
+
+    chats_query = select(ChatInDB).where(ChatInDB.id.in_(membership)).options(joinedload(ChatInDB.owner))
+    if since is None:
+        last_message_id = session.exec(select(func.max(MessageInDB.id))).one() or 0
+        messages, has_more = [], False
+    else:
+        since_time, last_message_id = decode_cursor(since)
+        # Overlap by a margin so changes stamped before a slow commit are not skipped
+        chats_query = chats_query.join(
+            EntityVersionInDB, and_(EntityVersionInDB.kind == "chat", EntityVersionInDB.entity_id == ChatInDB.id)
+        ).where(EntityVersionInDB.updated_at > since_time - SYNC_OVERLAP)
+        in_own_chats = MessageInDB.chat_id.in_(membership)
+        messages = session.exec(
+            select(MessageInDB)
+            .where(in_own_chats, MessageInDB.id > last_message_id)
+            .order_by(MessageInDB.id)
+            .limit(limit + 1)
+            .options(joinedload(MessageInDB.user))
+        ).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        # PostgreSQL can commit a lower id after a higher one was already synced, so messages
+        # from just before the last sync are sent again; clients de-duplicate them by id
+        overlap = session.exec(
+            select(MessageInDB)
+            .where(in_own_chats, MessageInDB.created_at > since_time - SYNC_OVERLAP,
+                   MessageInDB.id <= last_message_id)
+            .order_by(MessageInDB.id)
+            .options(joinedload(MessageInDB.user))
+        ).all()
+        if messages:
+            last_message_id = messages[-1].id
+        messages = overlap + messages
+
+    chats = session.exec(chats_query).all()
+
+    return SyncResponse(
+        meta=SyncMeta(
+            watermark=encode_cursor(synced_at, last_message_id),
+            has_more=has_more,
+            message_count=len(messages)
+        ),
+        chat_ids=chat_ids,
+        chats=[ChatPublic.from_orm(chat) for chat in chats],
+        messages=[MessagePublic.from_orm(msg) for msg in messages]
+    )
 
 
 # GET /users
 @app.get("/users", tags=["Users"], summary="Get all users",
-         description="Retrieves a list of all users in the system",
+         description="Retrieves a page of users ordered by username. With `q`, only users whose username starts "
+                     "with `q`, or whose email starts with it in any case. Pass `meta.next_cursor` as `after` to "
+                     "fetch the next page.",
          response_model=UsersResponse)
-async def get_users(session: Session = Depends(get_session)):
-    users = session.exec(select(UserInDB)).all()
-    result = [UserPublic.from_orm(user) for user in users]
-    return UsersResponse(meta=Meta(count=len(result)), users=result)
+def get_users(
+        q: Optional[str] = Query(None, min_length=1, description="Username or email prefix"),
+        after: Optional[str] = Query(None, description="Return users after this cursor"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        session: Session = Depends(get_session)
+):
+    rows = list_users(session, limit, after=decode_key_cursor(after) if after else None, q=q)
+    users = [user_row(row) for row in rows[:limit]]
+    meta = {"count": len(users), "next_cursor": None}
+    if len(rows) > limit:
+        meta["next_cursor"] = encode_key_cursor(users[-1]["username"])
+    return json_response({"meta": meta, "users": users})
+
+
+# GET /users/typeahead
+@app.get("/users/typeahead", tags=["Users"], summary="Suggest users by prefix",
+         description="Returns up to `limit` users whose username, or else email, starts with `q`, for user "
+                     "pickers. Reads a handful of index entries whatever the number of users.",
+         response_model=TypeaheadResponse)
+def get_users_typeahead(
+        q: str = Query(..., min_length=1, description="Username or email prefix"),
+        limit: int = Query(10, ge=1, le=TYPEAHEAD_LIMIT),
+        session: Session = Depends(get_session)
+):
+    return json_response({"users": typeahead_users(session, q, limit)})
 
 
 # POST /auth/registration in auth.py
@@ -68,26 +283,25 @@ async def get_users(session: Session = Depends(get_session)):
 @app.get("/users/{user_id}", tags=["Users"], summary="Get a user by ID",
          description="Fetches details of a user by ID",
          response_model=UserResponse)
-async def get_user(user_id: int, session: Session = Depends(get_session)):
-    user = session.exec(select(UserInDB).where(UserInDB.id == user_id)).first()
+def get_user(user_id: int, request: Request, response: Response, session: Session = Depends(get_session)):
+    if not_modified := conditional_response(request, response, session, ("user", user_id)):
+        return not_modified
+    user = lookups.get_profile(session, user_id, response.headers.get("ETag"))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"user": user}
+    return json_response({"user": user}, response)
 
 
 # GET /users/{user_id}/chats
 @app.get("/users/{user_id}/chats", tags=["Users"], summary="Get chats for a specific user",
          description="Fetches a list of chats that a user is part of",
          response_model=ChatsResponse)
-async def get_user_chats(user_id: int, session: Session = Depends(get_session)):
-    user = session.get(UserInDB, user_id)
-    if not user:
+def get_user_chats(user_id: int, session: Session = Depends(get_session)):
+    chats = lookups.get_user_chats(session, user_id)
+    if chats is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    chats = session.exec(select(ChatInDB).where(ChatInDB.users.any(id=user_id))).all()  # type: ignore
-    result = [ChatPublic.from_orm(chat) for chat in chats]
-
-    return ChatsResponse(meta=ChatsMeta(count=len(result)), chats=result)
+    return json_response({"meta": {"count": len(chats)}, "chats": chats})
 
 
 # Chat routes ========================================
@@ -96,23 +310,27 @@ async def get_user_chats(user_id: int, session: Session = Depends(get_session)):
 @app.get("/chats", tags=["Chats"], summary="Get all chats",
          description="Retrieves a list of all chats",
          response_model=ChatsResponse)
-async def get_chats(session: Session = Depends(get_session)):
-    chat_records = session.exec(select(ChatInDB).options(joinedload(ChatInDB.owner))).all()
-    chats = [ChatPublic.from_orm(chat_record) for chat_record in chat_records]
+def get_chats(session: Session = Depends(get_session)):
+    chats = [chat_row(row) for row in session.exec(select_chats())]
 
-    response = ChatsResponse(
-        meta=ChatsMeta(count=len(chats)),
-        chats=chats
-    )
-
-    return response
+    return json_response({"meta": {"count": len(chats)}, "chats": chats})
 
 
 # GET /chats/{chat_id}
 @app.get("/chats/{chat_id}", tags=["Chats"], summary="Get a chat by ID",
          description="Fetches details of a specific chat by ID")
-async def get_chat(chat_id: int, include: Optional[List[str]] = Query(None), session: Session = Depends(get_session)):
-    chat = session.get(ChatInDB, chat_id)
+def get_chat(
+        chat_id: int,
+        request: Request,
+        response: Response,
+        include: Optional[List[str]] = Query(None),
+        session: Session = Depends(get_session)
+):
+    if not_modified := conditional_response(request, response, session, ("chat", chat_id), ALL_USERS):
+        return not_modified
+    # Cached entries are kept per ETag, so another worker's rename is never served under its new ETag
+    etag = response.headers.get("ETag")
+    chat = lookups.get_chat(session, chat_id, etag)
     if not chat:
         raise HTTPException(
             status_code=404,
@@ -123,38 +341,34 @@ async def get_chat(chat_id: int, include: Optional[List[str]] = Query(None), ses
             }
         )
 
-    messages = session.exec(select(MessageInDB).where(MessageInDB.chat_id == chat_id)).all()
-    message_count = len(messages)
+    stats = get_chat_stats(session, chat_id)
 
-    users = session.exec(
-        select(UserInDB).join(ChatInDB.users).where(ChatInDB.id == chat_id)
-    ).all()
-    user_count = len(users)
-
-    chat_response = ChatPublic.from_orm(chat)
-
-    response = {
+    body = {
         "meta": {
-            "message_count": message_count,
-            "user_count": user_count
+            "message_count": stats.message_count,
+            "user_count": stats.user_count,
+            "last_message_at": stats.last_message_at
         },
-        "chat": chat_response.dict()
+        "chat": chat
     }
 
     if include:
         if "messages" in include:
-            response["messages"] = [MessagePublic.from_orm(msg).dict() for msg in messages]
+            messages = session.exec(
+                select_messages().where(MessageInDB.chat_id == chat_id).order_by(MessageInDB.created_at, MessageInDB.id)
+            )
+            body["messages"] = [message_row(row) for row in messages]
         if "users" in include:
-            response["users"] = [UserPublic.from_orm(user).dict() for user in users]
+            body["users"] = lookups.get_chat_members(session, chat_id, etag)
 
-    return response
+    return json_response(body, response)
 
 
 # PUT /chats/{chat_id}
 @app.put("/chats/{chat_id}", tags=["Chats"], summary="Update a chat by ID",
          description="Updates the details of an existing chat",
          response_model=ChatResponse)
-async def update_chat(chat_id: int, update_data: Dict[str, str], session: Session = Depends(get_session)):
+def update_chat(chat_id: int, update_data: Dict[str, str], session: Session = Depends(get_session)):
     chat = session.get(ChatInDB, chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail={
@@ -166,8 +380,10 @@ async def update_chat(chat_id: int, update_data: Dict[str, str], session: Sessio
         chat.name = update_data['name']
 
     session.add(chat)
+    bump_version(session, "chat", chat_id)
     session.commit()
     session.refresh(chat)
+    lookups.invalidate_chat(chat_id)
 
     chat_response = ChatPublic.from_orm(chat)
 
@@ -176,9 +392,28 @@ async def update_chat(chat_id: int, update_data: Dict[str, str], session: Sessio
 
 # GET /chats/{chat_id}/messages
 @app.get("/chats/{chat_id}/messages", tags=["Chats"], summary="Get messages for a specific chat",
-         description="Retrieves all messages from a chat, identified by ID",
+         description="Retrieves a page of messages from a chat, identified by ID. Without a cursor the newest "
+                     "page is returned; pass `meta.next_cursor` as `before` to page back through older messages "
+                     "and `meta.prev_cursor` as `after` to fetch newer ones.",
          response_model=MessagesResponse)
-async def get_chat_messages(chat_id: int, session: Session = Depends(get_session)):
+def get_chat_messages(
+        chat_id: int,
+        request: Request,
+        response: Response,
+        before: Optional[str] = Query(None, description="Return messages older than this cursor"),
+        after: Optional[str] = Query(None, description="Return messages newer than this cursor"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        session: Session = Depends(get_session)
+):
+    if before and after:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail={
+            "type": "invalid_cursor",
+            "error_description": "before and after cannot be combined"
+        })
+
+    if not_modified := conditional_response(request, response, session, ("chat", chat_id), ALL_USERS):
+        return not_modified
+
     chat = session.get(ChatInDB, chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail={
@@ -187,26 +422,82 @@ async def get_chat_messages(chat_id: int, session: Session = Depends(get_session
             "entity_id": chat_id
         })
 
-    messages = session.exec(
-        select(MessageInDB).where(MessageInDB.chat_id == chat_id).options(joinedload(MessageInDB.user))).all()
-    result = [MessagePublic.from_orm(msg) for msg in messages]
+    position = tuple_(MessageInDB.created_at, MessageInDB.id)
+    query = select_messages().where(MessageInDB.chat_id == chat_id)
+
+    if after:
+        query = query.where(position > tuple_(*decode_cursor(after)))
+        query = query.order_by(MessageInDB.created_at, MessageInDB.id).limit(limit)
+        messages = session.exec(query).all()
+        has_older = True
+    else:
+        if before:
+            query = query.where(position < tuple_(*decode_cursor(before)))
+        # Fetch one extra row to learn whether an older page exists
+        query = query.order_by(MessageInDB.created_at.desc(), MessageInDB.id.desc()).limit(limit + 1)
+        messages = session.exec(query).all()
+        has_older = len(messages) > limit
+        messages = messages[:limit][::-1]
+
+    result = [message_row(row) for row in messages]
+    meta = {"count": len(result), "next_cursor": None, "prev_cursor": None}
+    if result:
+        if has_older:
+            meta["next_cursor"] = encode_cursor(result[0]["created_at"], result[0]["id"])
+        meta["prev_cursor"] = encode_cursor(result[-1]["created_at"], result[-1]["id"])
+    elif after:
+        meta["prev_cursor"] = after
+
+    return json_response({"meta": meta, "messages": result}, response)
+
+
+# GET /chats/{chat_id}/export
+@app.get("/chats/{chat_id}/export", tags=["Chats"], summary="Export a chat's messages",
+         description="Streams every message in the chat, oldest first, as newline-delimited JSON (one message "
+                     "object per line) or CSV. `since` and `until` limit the export to messages created in "
+                     "[since, until). With `gzip=true` the file is gzip-compressed.",
+         response_class=StreamingResponse)
+def export_chat_messages(
+        chat_id: int,
+        format: Literal["ndjson", "csv"] = Query("ndjson"),
+        since: Optional[datetime] = Query(None, description="Only messages created at or after this time"),
+        until: Optional[datetime] = Query(None, description="Only messages created before this time"),
+        gzip: bool = Query(False, description="Compress the export with gzip"),
+        session: Session = Depends(get_session)
+):
+    if not lookups.chat_exists(session, chat_id):
+        raise HTTPException(status_code=404, detail={
+            "type": "entity_not_found",
+            "entity_name": "Chat",
+            "entity_id": chat_id
+        })
+
+    chunks = export_messages(session.get_bind(), chat_id, format, since=since, until=until)
+    filename = f"chat-{chat_id}-messages.{format}"
+    media_type = media_types[format]
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
 
-    return MessagesResponse(meta=Meta(count=len(result)), messages=result)
+    return StreamingResponse(chunks, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 
 # GET /chats/{chat_id}/users
 @app.get("/chats/{chat_id}/users", tags=["Chats"], summary="Get users in a specific chat",
          description="Retrieves all users from a chat, identified by ID",
          response_model=UsersResponse)
-async def get_chat_users(chat_id: int, session: Session = Depends(get_session)):
-    chat = session.get(ChatInDB, chat_id)
-    if not chat:
+def get_chat_users(chat_id: int, request: Request, response: Response, session: Session = Depends(get_session)):
+    if not_modified := conditional_response(request, response, session, ("chat", chat_id), ALL_USERS):
+        return not_modified
+    etag = response.headers.get("ETag")
+    if not lookups.chat_exists(session, chat_id, etag):
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    users = session.exec(select(UserInDB).where(UserInDB.chats.any(id=chat_id))).all()  # type: ignore
-    result = [UserPublic.from_orm(user) for user in users]
+    result = lookups.get_chat_members(session, chat_id, etag)
 
-    return UsersResponse(meta=Meta(count=len(result)), users=result)
+    return json_response({"meta": {"count": len(result)}, "users": result}, response)
 
 
 # POST /chats
@@ -231,11 +522,33 @@ async def get_chat_users(chat_id: int, session: Session = Depends(get_session)):
 
 # GET /users/me (moved to be before /users/{user_id} to avoid conflict)
 
+# GET /chats/{chat_id}/receipts
+@app.get("/chats/{chat_id}/receipts", tags=["Chats"], summary="Get read receipts for a chat",
+         description="Returns how far each member of the chat has read, as the id of the last message they read",
+         response_model=ReadReceiptsResponse)
+def get_chat_receipts(
+        chat_id: int,
+        session: Session = Depends(get_session)
+):
+    if not lookups.chat_exists(session, chat_id):
+        raise HTTPException(status_code=404, detail={
+            "type": "entity_not_found",
+            "entity_name": "Chat",
+            "entity_id": chat_id
+        })
+
+    receipts = [
+        ReadReceipt(user_id=entry.user_id, last_read_message_id=entry.last_read_message_id)
+        for entry in get_read_receipts(session, chat_id)
+    ]
+    return ReadReceiptsResponse(meta=Meta(count=len(receipts)), receipts=receipts)
+
+
 # PUT /users/me
 @app.put("/users/me", tags=["Users"], summary="Update the current user",
          description="Updates the username or email of the current user",
          response_model=UserResponse)
-async def update_current_user(
+def update_current_user(
         update_data: UserUpdate = Body(...),
         current_user: UserInDB = Depends(get_current_user),
         session: Session = Depends(get_session)
@@ -253,8 +566,12 @@ async def update_current_user(
         current_user.email = update_data.email
 
     session.add(current_user)
+    bump_version(session, "user", current_user.id)
+    bump_version(session, *ALL_USERS)
     session.commit()
     session.refresh(current_user)
+    invalidate_principal(current_user.id)
+    lookups.invalidate_user(current_user.id)
 
     return UserResponse(user=UserPublic.from_orm(current_user))
 
@@ -262,12 +579,14 @@ async def update_current_user(
 # POST /chats/{chat_id}/messages
 @app.post("/chats/{chat_id}/messages", tags=["Chats"], summary="Create a new message in a chat",
           description="Creates a new message in the chat, authored by the current user",
-          response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
-async def create_message(
+          response_model=MessageResponse, status_code=status.HTTP_201_CREATED,
+          dependencies=[Depends(rate_limit("messages", current_user_key)), Depends(message_limiter)])
+def create_message(
         chat_id: int,
         message_data: MessageCreate,
-        current_user: UserInDB = Depends(get_current_user),
-        session: Session = Depends(get_session)
+        current_user_id: int = Depends(get_current_user_id),
+        session: Session = Depends(get_session),
+        hub: ChatHub = Depends(get_hub)
 ):
     # Check if the chat exists
     chat = session.get(ChatInDB, chat_id)
@@ -281,23 +600,291 @@ async def create_message(
             }
         )
 
-    # Create new message
-    new_message = MessageInDB(
-        text=message_data.text,
-        chat_id=chat_id,
-        user_id=current_user.id,
-        created_at=datetime.utcnow()
+    # The token is trusted without a user lookup, so make sure its user still exists
+    author = lookups.get_profile(session, current_user_id)
+    if author is None:
+        raise credentials_exception
+
+    created_at = datetime.utcnow()
+    if groupcommit.group_commit:
+        # End the read transaction so it does not hold up the writer's commit
+        session.commit()
+        writer = groupcommit.get_writer(session.get_bind())
+        pending = writer.submit(chat_id, current_user_id, message_data.text, created_at)
+        try:
+            message_id = pending.result(timeout=groupcommit.submit_timeout)
+        except TimeoutError:
+            # Still queued, so the writer may yet commit it; the client cannot tell whether it did
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail={
+                    "type": "commit_pending",
+                    "retry_after": 1
+                },
+                headers={"Retry-After": "1"},
+            )
+        response = MessageResponse(message=MessagePublic(
+            id=message_id, text=message_data.text, chat_id=chat_id, user=UserBase(**author), created_at=created_at
+        ))
+    else:
+        # Create new message
+        new_message = MessageInDB(
+            text=message_data.text,
+            chat_id=chat_id,
+            user_id=current_user_id,
+            created_at=created_at
+        )
+
+        record_message(session, chat_id, new_message.created_at)
+        bump_version(session, "chat", chat_id)
+        session.add(new_message)
+        session.flush()
+        record_inbox_message(session, chat_id, new_message.id, current_user_id, new_message.text, created_at)
+        session.commit()
+        session.refresh(new_message)
+
+        response = MessageResponse(message=MessagePublic.from_orm(new_message))
+
+    # Push to live subscribers only once the message is committed
+    anyio.from_thread.run(hub.publish, chat_id, {"type": "message", "message": response.message.model_dump(mode="json")})
+
+    return response
+
+
+# POST /chats/{chat_id}/messages:batch
+@app.post("/chats/{chat_id}/messages:batch", tags=["Chats"], summary="Create many messages in a chat",
+          description="Creates up to 1000 messages in the chat in one transaction, authored by the current user. "
+                      "Items that fail validation are reported in `errors` by index and the rest are created.",
+          response_model=MessageBatchResponse, status_code=status.HTTP_201_CREATED,
+          dependencies=[Depends(message_limiter)])
+def create_messages_batch(
+        chat_id: int,
+        items: List[Any] = Body(..., max_length=MAX_BATCH_SIZE),
+        current_user: UserInDB = Depends(get_current_user),
+        session: Session = Depends(get_session),
+        hub: ChatHub = Depends(get_hub)
+):
+    # One token per item, so large batches use up the budget as fast as their messages would
+    charge("bulk_messages", current_user_key(current_user.id), cost=len(items))
+
+    chat = session.get(ChatInDB, chat_id)
+    if not chat:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "type": "entity_not_found",
+                "entity_name": "Chat",
+                "entity_id": chat_id
+            }
+        )
+
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append(MessageCreate.model_validate(item))
+        except ValidationError as e:
+            errors.append(BatchError(index=index, detail=e.errors(include_url=False, include_context=False)))
+
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail={
+            "type": "invalid_batch",
+            "errors": [error.model_dump() for error in errors]
+        })
+
+    created_at = datetime.utcnow()
+    rows = [
+        {"text": message.text, "chat_id": chat_id, "user_id": current_user.id, "created_at": created_at}
+        for message in valid
+    ]
+    record_message(session, chat_id, created_at, count=len(rows))
+    bump_version(session, "chat", chat_id)
+    # One multi-row INSERT ... RETURNING, with rows returned in the order of `valid`
+    inserted = session.exec(
+        insert(MessageInDB).returning(
+            MessageInDB.id, MessageInDB.text, MessageInDB.created_at, sort_by_parameter_order=True
+        ),
+        params=rows
+    ).all()
+    last = inserted[-1]
+    record_inbox_message(session, chat_id, last.id, current_user.id, last.text, created_at, count=len(inserted))
+    session.commit()
+
+    author = UserBase.from_orm(current_user)
+    messages = [
+        MessagePublic(id=row.id, text=row.text, chat_id=chat_id, user=author, created_at=row.created_at)
+        for row in inserted
+    ]
+
+    for message in messages:
+        anyio.from_thread.run(hub.publish, chat_id, {"type": "message", "message": message.model_dump(mode="json")})
+
+    return MessageBatchResponse(
+        meta=MessageBatchMeta(count=len(messages), error_count=len(errors)),
+        messages=messages,
+        errors=errors
     )
 
-    session.add(new_message)
+
+# POST /chats/{chat_id}/read
+@app.post("/chats/{chat_id}/read", tags=["Chats"], summary="Mark a chat as read",
+          description="Moves the current user's read watermark in the chat forward to `message_id`, or to the "
+                      "newest message when it is omitted, and returns the number of messages still unread. "
+                      "The watermark never moves backwards.",
+          response_model=ReadStateResponse)
+def mark_chat_read(
+        chat_id: int,
+        marker: Optional[ReadMarker] = Body(None),
+        current_user_id: int = Depends(get_current_user_id),
+        session: Session = Depends(get_session),
+        hub: ChatHub = Depends(get_hub)
+):
+    if not lookups.chat_exists(session, chat_id):
+        raise HTTPException(status_code=404, detail={
+            "type": "entity_not_found",
+            "entity_name": "Chat",
+            "entity_id": chat_id
+        })
+
+    entry = mark_read(session, current_user_id, chat_id, marker.message_id if marker else None)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail={
+            "type": "not_a_member",
+            "chat_id": chat_id
+        })
+    read_state = ReadState(chat_id=chat_id, last_read_message_id=entry.last_read_message_id,
+                           unread_count=entry.unread_count)
     session.commit()
-    session.refresh(new_message)
 
-    # Get the public representation of the message
-    message_public = session.exec(
-        select(MessageInDB).where(MessageInDB.id == new_message.id)
-    ).first()
+    anyio.from_thread.run(hub.publish, chat_id, {
+        "type": "read", "user_id": current_user_id, "message_id": read_state.last_read_message_id
+    })
+
+    return ReadStateResponse(read_state=read_state)
+
+
+# Search routes ========================================
+
+# GET /search/messages
+@app.get("/search/messages", tags=["Search"], summary="Search messages",
+         description="Full-text search over message text, best matches first, optionally limited to a chat "
+                     "or an author. Pass `meta.next_offset` as `offset` to fetch the next page.",
+         response_model=MessageSearchResponse)
+def search_messages_route(
+        q: str = Query(..., min_length=1, description="Words that must all appear in the message"),
+        chat_id: Optional[int] = Query(None),
+        user_id: Optional[int] = Query(None),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        offset: int = Query(0, ge=0),
+        session: Session = Depends(get_session)
+):
+    if not q.split():
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail={
+            "type": "invalid_query",
+            "error_description": "q must contain at least one word"
+        })
+
+    # Fetch one extra row to learn whether another page exists
+    messages = search_messages(session, q, chat_id=chat_id, user_id=user_id, limit=limit + 1, offset=offset)
+    result = [MessagePublic.from_orm(msg) for msg in messages[:limit]]
+
+    meta = SearchMeta(count=len(result), offset=offset)
+    if len(messages) > limit:
+        meta.next_offset = offset + limit
+
+    return MessageSearchResponse(meta=meta, messages=result)
+
+
+# Real-time routes ========================================
+
+def _chat_exists(session: Session, chat_id: int) -> bool:
+    exists = session.get(ChatInDB, chat_id) is not None
+    # End the read transaction so the pooled connection is released; subscriptions
+    # stay open far longer than a request
+    session.rollback()
+    return exists
+
+
+# WS /chats/{chat_id}/ws
+@app.websocket("/chats/{chat_id}/ws")
+async def chat_websocket(
+        websocket: WebSocket,
+        chat_id: int,
+        session: Session = Depends(get_session),
+        hub: ChatHub = Depends(get_hub)
+):
+    if not await run_in_threadpool(_chat_exists, session, chat_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    async with hub.subscription(chat_id) as queue:
+        async def forward_events():
+            while True:
+                await websocket.send_json(await queue.get())
+
+        sender = asyncio.create_task(forward_events())
+        try:
+            # Clients do not send anything; receiving is how we notice a disconnect
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+
+
+# GET /chats/{chat_id}/events
+@app.get("/chats/{chat_id}/events", tags=["Chats"], summary="Stream new messages in a chat",
+         description="Server-sent events fallback for the chat websocket; emits a `message` event per new message",
+         response_class=StreamingResponse)
+async def get_chat_events(chat_id: int, session: Session = Depends(get_session), hub: ChatHub = Depends(get_hub)):
+    if not await run_in_threadpool(_chat_exists, session, chat_id):
+        raise HTTPException(status_code=404, detail={
+            "type": "entity_not_found",
+            "entity_name": "Chat",
+            "entity_id": chat_id
+        })
+
+    async def event_stream():
+        async with hub.subscription(chat_id) as queue:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Operations routes ========================================
+
+# GET /metrics/cache
+@app.get("/metrics/cache", tags=["Operations"], summary="Read-through cache statistics",
+         description="Hit and miss counts for each cached lookup since the process started")
+def get_cache_metrics():
+    return lookups.cache_stats()
+
+
+# GET /metrics
+@app.get("/metrics", tags=["Operations"], summary="Prometheus metrics",
+         description="Request, latency, SQL, bcrypt and cache metrics in the Prometheus text format",
+         response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+coldstart.mark_imported()
+
+mangum_handler = Mangum(app)
 
-    return MessageResponse(message=MessagePublic.from_orm(message_public))
 
-lambda_handler = Mangum(app)
\ No newline at end of file
+def lambda_handler(event, context):
+    with coldstart.first_invocation():
+        return mangum_handler(event, context)
\ No newline at end of file
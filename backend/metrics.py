@@ -0,0 +1,197 @@
+import bisect
+import threading
+import time
+from typing import Dict, Sequence, Tuple
+
+from . import profiling
+from .profiling import RequestStats, current_request
+
+# Latency buckets in seconds, from a cached read to a slow bcrypt login
+latency_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+query_count_buckets = (1, 2, 3, 5, 10, 25, 50, 100)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, values, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [("", key, "", value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (), buckets=latency_buckets):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            counts[index] += 1
+            self._values[key][1] = total + value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    samples.append(("_bucket", key, f'le="{le}"', cumulative))
+                samples.append(("_sum", key, "", total))
+                samples.append(("_count", key, "", cumulative))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        metrics = list(self.metrics)
+        for collect in self.collectors:
+            metrics.extend(collect())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled, by route template and status.", ("method", "route", "status")))
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to produce a complete response.", ("method", "route")))
+requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", ("method",)))
+request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ("method", "route"), query_count_buckets))
+request_db_duration = registry.register(Histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL per request.", ("method", "route")))
+password_hash_duration = registry.register(Histogram(
+    "password_hash_duration_seconds", "Time spent in bcrypt, by operation.", ("operation",)))
+
+
+def timed_password_hash(operation: str, function, *args):
+    """Run a passlib call, recording how long bcrypt took."""
+    start = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        password_hash_duration.observe(time.perf_counter() - start, operation=operation)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency, in-flight requests and SQL work.
+
+    Routes are labelled by their template (`/chats/{chat_id}`) so label cardinality stays
+    bounded; requests that match no route are grouped under `unmatched`. With SQL profiling
+    on, responses also carry a `Server-Timing` header for the statements run before the
+    response started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats(method, scope["path"], profile=profiling.sql_profiling)
+        token = current_request.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+        # The route is only known once routing has run, so in-flight requests are per method
+        requests_in_flight.inc(method=method)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if stats.queries is not None:
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", stats.server_timing().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            requests_in_flight.dec(method=method)
+            current_request.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            requests_total.inc(method=method, route=route, status=status_code)
+            request_duration.observe(elapsed, method=method, route=route)
+            request_db_queries.observe(stats.query_count, method=method, route=route)
+            request_db_duration.observe(stats.query_seconds, method=method, route=route)
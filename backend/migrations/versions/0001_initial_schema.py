@@ -0,0 +1,125 @@
+"""Initial schema: the tables create_all used to make, adopting databases that already have them
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-04-01 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Databases created before migrations existed (pony_express.db, initial.db, EFS) already
+    # have some or all of these tables; only create what is missing.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("email"),
+        )
+    op.create_index("ix_users_username", "users", ["username"], unique=True, if_not_exists=True)
+
+    if "chats" not in existing:
+        op.create_table(
+            "chats",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("owner_id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+    if "user_chat_links" not in existing:
+        op.create_table(
+            "user_chat_links",
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("chat_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["chat_id"], ["chats.id"]),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("user_id", "chat_id"),
+        )
+
+    if "messages" not in existing:
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("text", sa.String(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("chat_id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["chat_id"], ["chats.id"]),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+    op.create_index("ix_messages_chat_id_created_at_id", "messages", ["chat_id", "created_at", "id"],
+                    if_not_exists=True)
+    op.create_index("ix_messages_chat_id_id", "messages", ["chat_id", "id"], if_not_exists=True)
+
+    if "chat_stats" not in existing:
+        op.create_table(
+            "chat_stats",
+            sa.Column("chat_id", sa.Integer(), nullable=False),
+            sa.Column("message_count", sa.Integer(), nullable=False),
+            sa.Column("user_count", sa.Integer(), nullable=False),
+            sa.Column("last_message_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["chat_id"], ["chats.id"]),
+            sa.PrimaryKeyConstraint("chat_id"),
+        )
+
+    if "entity_versions" not in existing:
+        op.create_table(
+            "entity_versions",
+            sa.Column("kind", sa.String(), nullable=False),
+            sa.Column("entity_id", sa.Integer(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("kind", "entity_id"),
+        )
+
+    # Full-text search. Plain SQL rather than backend.search.create_search_index, which follows
+    # the current code.
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(text, content='messages', content_rowid='id')"
+        )
+        op.execute("""CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+        END""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF text ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+        END""")
+        if "messages_fts" not in existing:
+            op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        op.execute(
+            "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('english', text)) STORED"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING gin (search_vector)")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        for trigger in ("messages_fts_insert", "messages_fts_delete", "messages_fts_update"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS messages_fts")
+    for table in ("entity_versions", "chat_stats", "messages", "user_chat_links", "chats", "users"):
+        op.drop_table(table)
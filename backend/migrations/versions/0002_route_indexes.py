@@ -0,0 +1,32 @@
+"""Index the foreign keys the routes filter on
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-04-02 00:00:00
+
+messages.chat_id is already the leading column of the keyset index from 0001, and
+users.email is covered by the index behind its UNIQUE constraint, so neither needs another.
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Memberships by user are served by the (user_id, chat_id) primary key, but the member
+    # lists of GET /chats/{chat_id}/users and ?include=users look them up by chat
+    op.create_index("ix_user_chat_links_chat_id", "user_chat_links", ["chat_id"], if_not_exists=True)
+    # Remaining foreign keys to users, so per-user lookups and deletes do not scan
+    op.create_index("ix_messages_user_id", "messages", ["user_id"], if_not_exists=True)
+    op.create_index("ix_chats_owner_id", "chats", ["owner_id"], if_not_exists=True)
+    # The create_all era marker table; alembic_version replaces it
+    op.execute("DROP TABLE IF EXISTS schema_version")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_chats_owner_id", table_name="chats")
+    op.drop_index("ix_messages_user_id", table_name="messages")
+    op.drop_index("ix_user_chat_links_chat_id", table_name="user_chat_links")
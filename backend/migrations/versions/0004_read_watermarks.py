@@ -0,0 +1,24 @@
+"""Per-user read watermarks on inbox entries
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-04-15 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("inbox_entries", sa.Column("last_read_message_id", sa.Integer(), nullable=True))
+    # Entries without unread messages have read everything so far
+    op.execute("UPDATE inbox_entries SET last_read_message_id = last_message_id WHERE unread_count = 0")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("inbox_entries") as batch_op:
+        batch_op.drop_column("last_read_message_id")
@@ -0,0 +1,23 @@
+"""Index lower(email) for the user directory's prefix search
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-04-22 00:00:00
+
+Username prefixes are served by the existing ix_users_username.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_users_email_lower", "users", [sa.text("lower(email)")], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_email_lower", table_name="users")
@@ -0,0 +1,31 @@
+"""Index username and lower(email) under the "C" collation on PostgreSQL
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-04-29 00:00:00
+
+The directory's prefix ranges only equal "starts with" when strings compare by code point,
+so on PostgreSQL they are compared under "C" and need matching indexes. SQLite already
+compares by code point and uses ix_users_username and ix_users_email_lower.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.create_index("ix_users_username_c", "users", [sa.text('username COLLATE "C"')], if_not_exists=True)
+    op.create_index("ix_users_email_lower_c", "users", [sa.text('lower(email) COLLATE "C"')], if_not_exists=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.drop_index("ix_users_email_lower_c", table_name="users")
+    op.drop_index("ix_users_username_c", table_name="users")
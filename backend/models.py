@@ -1,6 +1,6 @@
-from typing import List
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 
@@ -72,11 +72,25 @@ class Meta(BaseModel):
     count: int
 
 
+class UsersMeta(BaseModel):
+    count: int
+    next_cursor: Optional[str] = None
+
+
 class UsersResponse(BaseModel):
-    meta: Meta
+    meta: UsersMeta
     users: List[UserPublic]
 
 
+class UserSummary(BaseModel):
+    id: int
+    username: str
+
+
+class TypeaheadResponse(BaseModel):
+    users: List[UserSummary]
+
+
 class UserResponse(BaseModel):
     user: UserPublic
 
@@ -94,10 +108,116 @@ class MessageResponse(BaseModel):
     message: MessagePublic
 
 
+class MessagesMeta(BaseModel):
+    count: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
 class MessagesResponse(BaseModel):
-    meta: Meta
+    meta: MessagesMeta
     messages: List[MessagePublic]
 
 
+class BatchError(BaseModel):
+    index: int
+    detail: List[Dict[str, Any]]
+
+
+class MessageBatchMeta(BaseModel):
+    count: int
+    error_count: int
+
+
+class MessageBatchResponse(BaseModel):
+    meta: MessageBatchMeta
+    messages: List[MessagePublic]
+    errors: List[BatchError]
+
+
+class SearchMeta(BaseModel):
+    count: int
+    offset: int
+    next_offset: Optional[int] = None
+
+
+class MessageSearchResponse(BaseModel):
+    meta: SearchMeta
+    messages: List[MessagePublic]
+
+
+class SyncMeta(BaseModel):
+    watermark: str
+    has_more: bool
+    message_count: int
+
+
+class SyncResponse(BaseModel):
+    meta: SyncMeta
+    chat_ids: List[int]
+    chats: List[ChatPublic]
+    messages: List[MessagePublic]
+
+
+class InboxMessage(BaseModel):
+    id: int
+    text: str
+    user: UserBase
+    created_at: datetime
+
+
+class InboxEntry(BaseModel):
+    chat_id: int
+    chat_name: str
+    last_activity_at: datetime
+    unread_count: int
+    last_read_message_id: Optional[int] = None
+    last_message: Optional[InboxMessage] = None
+
+
+class InboxMeta(BaseModel):
+    count: int
+    next_cursor: Optional[str] = None
+
+
+class InboxResponse(BaseModel):
+    meta: InboxMeta
+    entries: List[InboxEntry]
+
+
+class ReadMarker(BaseModel):
+    message_id: Optional[int] = Field(None, ge=1)
+
+
+class ReadState(BaseModel):
+    chat_id: int
+    last_read_message_id: Optional[int] = None
+    unread_count: int
+
+
+class ReadStateResponse(BaseModel):
+    read_state: ReadState
+
+
+class ReadReceipt(BaseModel):
+    user_id: int
+    last_read_message_id: Optional[int] = None
+
+
+class ReadReceiptsResponse(BaseModel):
+    meta: Meta
+    receipts: List[ReadReceipt]
+
+
+class UnreadMeta(BaseModel):
+    count: int
+    total: int
+
+
+class UnreadResponse(BaseModel):
+    meta: UnreadMeta
+    chats: List[ReadState]
+
+
 class ChatResponse(BaseModel):
     chat: ChatPublic
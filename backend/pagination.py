@@ -0,0 +1,58 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_BATCH_SIZE = 1000
+SYNC_PAGE_SIZE = 500
+TYPEAHEAD_LIMIT = 20
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Encode a (created_at, id) keyset position as an opaque url-safe cursor."""
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _invalid_cursor(cursor: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail={
+            "type": "invalid_cursor",
+            "cursor": cursor
+        }
+    )
+
+
+def _b64decode(cursor: str) -> bytes:
+    # Strict: characters outside the url-safe alphabet are an error, not skipped
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return base64.b64decode(padded.encode(), altchars=b"-_", validate=True)
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by `encode_cursor`, raising a 422 if it is malformed."""
+    try:
+        created_at, row_id = json.loads(_b64decode(cursor))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise _invalid_cursor(cursor)
+
+
+def encode_key_cursor(key: str) -> str:
+    """Encode a position in a unique string column (e.g. a username) as an opaque cursor."""
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_key_cursor(cursor: str) -> str:
+    """Decode a cursor produced by `encode_key_cursor`, raising a 422 if it is malformed."""
+    try:
+        return _b64decode(cursor).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise _invalid_cursor(cursor)
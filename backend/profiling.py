@@ -0,0 +1,81 @@
+import contextvars
+import json
+import logging
+import os
+import time
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("backend.sql")
+
+# Opt-in: keep every statement of a request, log slow ones and send a Server-Timing header
+sql_profiling = os.environ.get("SQL_PROFILING", "false").lower() == "true"
+slow_query_threshold = float(os.environ.get("SLOW_QUERY_MS", 100)) / 1000  # seconds
+# Statements past this many are still counted but not listed in the Server-Timing header
+server_timing_max_queries = 20
+
+
+class QueryRecord(NamedTuple):
+    statement: str
+    seconds: float
+    # As reported by the driver; SELECTs on SQLite report -1
+    rows: int
+
+
+class RequestStats:
+    """SQL work done on behalf of the current request."""
+
+    def __init__(self, method: str = "", path: str = "", profile: bool = False):
+        self.method = method
+        self.path = path
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.queries: Optional[List[QueryRecord]] = [] if profile else None
+
+    def server_timing(self) -> str:
+        """A `Server-Timing` header value with the SQL total and, when profiling, each statement."""
+        entries = [f'db;dur={self.query_seconds * 1000:.2f};desc="{self.query_count} queries"']
+        for index, query in enumerate((self.queries or [])[:server_timing_max_queries], start=1):
+            entries.append(f'q{index};dur={query.seconds * 1000:.2f};desc="{_summary(query.statement)}"')
+        return ", ".join(entries)
+
+
+def _summary(statement: str, length: int = 60) -> str:
+    # Header-safe one-line prefix of the statement
+    text = " ".join(statement.split()).replace('"', "'").replace("\\", "")
+    return text if len(text) <= length else text[:length - 3] + "..."
+
+
+# Starlette copies the context into the threadpool for sync routes, so the same
+# RequestStats object is visible (and mutated) there.
+current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "current_request", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = current_request.get()
+    if stats is None:
+        return
+    stats.query_count += 1
+    stats.query_seconds += elapsed
+    if stats.queries is None:
+        return
+    stats.queries.append(QueryRecord(statement, elapsed, cursor.rowcount))
+    if elapsed >= slow_query_threshold:
+        logger.warning(json.dumps({
+            "event": "slow_query",
+            "method": stats.method,
+            "path": stats.path,
+            "duration_ms": round(elapsed * 1000, 2),
+            "rows": cursor.rowcount,
+            "statement": " ".join(statement.split()),
+        }))
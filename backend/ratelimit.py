@@ -0,0 +1,243 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, NamedTuple
+
+from fastapi import Depends, HTTPException, Request, status
+
+from .metrics import Counter, registry
+
+rate_limiting = os.environ.get("RATE_LIMITING", "true").lower() == "true"
+redis_url = os.environ.get("REDIS_URL")
+# Seconds a request may wait for a concurrency slot before it is shed with a 503
+admission_queue_timeout = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 5))
+
+rate_limited_total = registry.register(Counter(
+    "rate_limited_total", "Requests rejected with 429 by a rate limit budget.", ("budget",)))
+load_shed_total = registry.register(Counter(
+    "load_shed_total", "Requests rejected with 503 by a concurrency limiter.", ("limiter",)))
+
+
+class Budget(NamedTuple):
+    rate: float  # tokens added per second
+    burst: int  # bucket capacity
+
+
+def _budget(name: str, per_minute: int, burst: int) -> Budget:
+    prefix = f"RATE_LIMIT_{name.upper()}"
+    per_minute = int(os.environ.get(f"{prefix}_PER_MINUTE", per_minute))
+    return Budget(rate=per_minute / 60, burst=int(os.environ.get(f"{prefix}_BURST", burst)))
+
+
+# Per-route token buckets, keyed by client IP (auth routes) or user id (writes)
+budgets = {
+    "login": _budget("login", per_minute=20, burst=10),
+    "registration": _budget("registration", per_minute=10, burst=5),
+    "messages": _budget("messages", per_minute=120, burst=30),
+    # Charged one token per message in the batch, so the burst has to fit a full batch
+    "bulk_messages": _budget("bulk_messages", per_minute=1000, burst=1000),
+}
+
+
+class RateLimitBackend:
+    """Token bucket storage; implement `take` to share buckets between workers."""
+
+    def take(self, key: str, budget: Budget, cost: float = 1) -> float:
+        """Take `cost` tokens from `key`'s bucket. Returns 0 if allowed, else seconds until it would be."""
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-process buckets, least recently used evicted beyond `maxsize` keys."""
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, budget: Budget, cost: float = 1) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (budget.burst, now))
+            tokens = min(budget.burst, tokens + (now - updated_at) * budget.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / budget.rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Buckets shared through Redis, updated atomically by a Lua script using the server clock."""
+
+    script = """
+    local tokens_key, burst, rate, cost = KEYS[1], tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local time = redis.call('TIME')
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    local bucket = redis.call('HMGET', tokens_key, 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - updated_at) * rate)
+    local wait = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        wait = (cost - tokens) / rate
+    end
+    redis.call('HSET', tokens_key, 'tokens', tokens, 'updated_at', now)
+    redis.call('EXPIRE', tokens_key, math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, client, prefix: str = "pony:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._take = client.register_script(self.script)
+
+    def take(self, key: str, budget: Budget, cost: float = 1) -> float:
+        return float(self._take(keys=[self.prefix + key], args=[budget.burst, budget.rate, cost]))
+
+    def reset(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+def make_rate_limit_backend() -> RateLimitBackend:
+    if redis_url:
+        import redis  # optional dependency, only needed when REDIS_URL is set
+
+        return RedisRateLimitBackend(redis.Redis.from_url(redis_url))
+    return MemoryRateLimitBackend()
+
+
+backend = make_rate_limit_backend()
+
+
+def client_ip_key(request: Request) -> str:
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def charge(name: str, caller: str, cost: float = 1) -> None:
+    """Take `cost` tokens from budget `name` for `caller`, raising a 429 if they are not there."""
+    if not rate_limiting:
+        return
+    wait = backend.take(f"{name}:{caller}", budgets[name], cost)
+    if wait:
+        rate_limited_total.inc(budget=name)
+        retry_after = math.ceil(wait)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail={
+                "type": "rate_limited",
+                "budget": name,
+                "retry_after": retry_after
+            },
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+def rate_limit(name: str, key: Callable[..., str] = client_ip_key):
+    """Route dependency charging one token from budget `name` for the caller identified by `key`."""
+
+    def check_rate_limit(caller: str = Depends(key)) -> None:
+        charge(name, caller)
+
+    return check_rate_limit
+
+
+limiters: dict = {}
+
+
+class ConcurrencyLimiter:
+    """Admission control: at most `limit` requests run at once and at most `max_queue` wait.
+
+    Requests beyond the queue, or that wait longer than `queue_timeout`, are shed with a 503
+    so a flood of expensive requests cannot starve everything else on the worker.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float = admission_queue_timeout):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: deque = deque()
+        limiters[name] = self
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _overloaded(self) -> HTTPException:
+        load_shed_total.inc(limiter=self.name)
+        retry_after = math.ceil(self.queue_timeout)
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "type": "overloaded",
+                "limiter": self.name,
+                "retry_after": retry_after
+            },
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._overloaded()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # A releasing request hands its slot over directly, so `active` is unchanged
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._overloaded()
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def reset(self) -> None:
+        self.active = 0
+        self._waiters.clear()
+
+    async def __call__(self):
+        # Used as a route dependency; the slot is held until the response is ready
+        if not rate_limiting:
+            yield
+            return
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def reset() -> None:
+    backend.reset()
+    for limiter in limiters.values():
+        limiter.reset()
@@ -0,0 +1,47 @@
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Set
+
+heartbeat_interval = 15  # seconds
+subscriber_queue_size = 100
+
+
+class ChatHub:
+    """In-process fan-out of chat events to websocket and SSE subscribers.
+
+    Swap in another implementation (e.g. one backed by a broker) by overriding the
+    `get_hub` dependency; routes only rely on `publish` and `subscription`.
+    """
+
+    def __init__(self, queue_size: int = subscriber_queue_size):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscriber_count(self, chat_id: int) -> int:
+        return len(self._subscribers.get(chat_id, ()))
+
+    async def publish(self, chat_id: int, event: dict) -> None:
+        for queue in list(self._subscribers.get(chat_id, ())):
+            if queue.full():
+                # Slow consumer: drop its oldest event rather than block the publisher
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    @asynccontextmanager
+    async def subscription(self, chat_id: int) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[chat_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[chat_id].discard(queue)
+            if not self._subscribers[chat_id]:
+                del self._subscribers[chat_id]
+
+
+hub = ChatHub()
+
+
+def get_hub() -> ChatHub:
+    return hub
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Index, func
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -10,7 +11,7 @@ class UserChatLinkInDB(SQLModel, table=True):
     __tablename__ = "user_chat_links"
 
     user_id: int = Field(foreign_key="users.id", primary_key=True)
-    chat_id: int = Field(foreign_key="chats.id", primary_key=True)
+    chat_id: int = Field(foreign_key="chats.id", primary_key=True, index=True)
 
 
 class UserInDB(SQLModel, table=True):
@@ -30,6 +31,14 @@ class UserInDB(SQLModel, table=True):
     )
 
 
+# Email prefix search matches case-insensitively
+Index("ix_users_email_lower", func.lower(UserInDB.__table__.c.email))
+# PostgreSQL's usual collations do not order strings by code point, so prefix ranges are
+# compared under "C" there (see directory.code_point_order), which needs indexes of its own
+Index("ix_users_username_c", UserInDB.__table__.c.username.collate("C")).ddl_if(dialect="postgresql")
+Index("ix_users_email_lower_c", func.lower(UserInDB.__table__.c.email).collate("C")).ddl_if(dialect="postgresql")
+
+
 class ChatInDB(SQLModel, table=True):
     """Database model for chat."""
 
@@ -37,7 +46,7 @@ class ChatInDB(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
-    owner_id: int = Field(foreign_key="users.id")
+    owner_id: int = Field(foreign_key="users.id", index=True)
     created_at: Optional[datetime] = Field(default_factory=datetime.now)
 
     owner: UserInDB = Relationship()
@@ -52,13 +61,56 @@ class MessageInDB(SQLModel, table=True):
     """Database model for message."""
 
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     text: str
-    user_id: int = Field(foreign_key="users.id")
+    user_id: int = Field(foreign_key="users.id", index=True)
     chat_id: int = Field(foreign_key="chats.id")
     created_at: Optional[datetime] = Field(default_factory=datetime.now)
 
     user: UserInDB = Relationship()
     chat: ChatInDB = Relationship(back_populates="messages")
 
+
+class ChatStatsInDB(SQLModel, table=True):
+    """Database model for denormalized per-chat counters."""
+
+    __tablename__ = "chat_stats"
+
+    chat_id: int = Field(foreign_key="chats.id", primary_key=True)
+    message_count: int = 0
+    user_count: int = 0
+    last_message_at: Optional[datetime] = None
+
+
+class EntityVersionInDB(SQLModel, table=True):
+    """Database model for change counters used to build ETags."""
+
+    __tablename__ = "entity_versions"
+
+    kind: str = Field(primary_key=True)
+    entity_id: int = Field(primary_key=True)
+    version: int = 1
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class InboxEntryInDB(SQLModel, table=True):
+    """Database model for a user's view of one of their chats, kept up to date on every new message."""
+
+    __tablename__ = "inbox_entries"
+    __table_args__ = (
+        Index("ix_inbox_entries_user_id_last_activity_at_chat_id", "user_id", "last_activity_at", "chat_id"),
+    )
+
+    user_id: int = Field(foreign_key="users.id", primary_key=True)
+    chat_id: int = Field(foreign_key="chats.id", primary_key=True, index=True)
+    last_activity_at: datetime
+    last_message_id: Optional[int] = None
+    last_message_user_id: Optional[int] = None
+    last_message_preview: Optional[str] = None
+    unread_count: int = 0
+    last_read_message_id: Optional[int] = None
@@ -0,0 +1,112 @@
+import sys
+from typing import List, Optional
+
+from sqlalchemy import column, event, func, literal_column, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import joinedload
+from sqlmodel import Session, SQLModel, select
+
+from .schema import MessageInDB
+
+# SQLite: external-content FTS5 table over messages.text, kept in sync by triggers
+sqlite_ddl = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(text, content='messages', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF text ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+# PostgreSQL: generated tsvector column with a GIN index, maintained by the database itself
+postgres_ddl = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('english', text)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING gin (search_vector)",
+]
+
+messages_fts = table("messages_fts", column("rowid"), column("rank"), column("messages_fts"))
+
+
+def create_search_index(connection: Connection) -> None:
+    """Create the full-text index if it is missing, populating it from existing messages."""
+    if connection.dialect.name == "sqlite":
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+        ).first()
+        for statement in sqlite_ddl:
+            connection.execute(text(statement))
+        if not exists:
+            connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+    elif connection.dialect.name == "postgresql":
+        for statement in postgres_ddl:
+            connection.execute(text(statement))
+
+
+def rebuild_search_index(connection: Connection) -> None:
+    """Re-index every message, e.g. after bulk imports that bypassed the triggers."""
+    create_search_index(connection)
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+        connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')"))
+    elif connection.dialect.name == "postgresql":
+        connection.execute(text("REINDEX INDEX ix_messages_search_vector"))
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def _create_search_index_after_tables(target, connection, **kwargs):
+    create_search_index(connection)
+
+
+def fts5_query(q: str) -> str:
+    # Quote every term so user input is never parsed as FTS5 query syntax; terms are ANDed
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+
+def search_messages(
+        session: Session,
+        q: str,
+        chat_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        limit: int = 50,
+        offset: int = 0,
+) -> List[MessageInDB]:
+    """Messages matching `q`, best match first."""
+    query = select(MessageInDB).options(joinedload(MessageInDB.user))
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        query = (
+            query.join(messages_fts, messages_fts.c.rowid == MessageInDB.id)
+            .where(messages_fts.c.messages_fts.match(fts5_query(q)))
+            .order_by(messages_fts.c.rank, MessageInDB.id.desc())
+        )
+    elif dialect == "postgresql":
+        vector = literal_column("messages.search_vector")
+        ts_query = func.websearch_to_tsquery("english", q)
+        query = query.where(vector.op("@@")(ts_query)).order_by(
+            func.ts_rank(vector, ts_query).desc(), MessageInDB.id.desc()
+        )
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+    if chat_id is not None:
+        query = query.where(MessageInDB.chat_id == chat_id)
+    if user_id is not None:
+        query = query.where(MessageInDB.user_id == user_id)
+
+    return session.exec(query.limit(limit).offset(offset)).all()
+
+
+if __name__ == "__main__":
+    # python -m backend.search rebuild
+    from .database import engine
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m backend.search rebuild")
+    with engine.begin() as connection:
+        rebuild_search_index(connection)
@@ -0,0 +1,53 @@
+from typing import Any, Optional
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.orm import aliased
+from sqlmodel import select
+
+from .schema import ChatInDB, MessageInDB, UserInDB
+
+user_columns = (UserInDB.id, UserInDB.username, UserInDB.email, UserInDB.created_at)
+
+_owner = aliased(UserInDB)
+_author = aliased(UserInDB)
+
+
+def select_users():
+    return select(*user_columns)
+
+
+def user_row(row) -> dict:
+    return {"id": row[0], "username": row[1], "email": row[2], "created_at": row[3]}
+
+
+def select_chats():
+    return (
+        select(ChatInDB.id, ChatInDB.name, ChatInDB.created_at,
+               _owner.id, _owner.username, _owner.email, _owner.created_at)
+        .join(_owner, _owner.id == ChatInDB.owner_id)
+    )
+
+
+def chat_row(row) -> dict:
+    return {"id": row[0], "name": row[1], "owner": user_row(row[3:7]), "created_at": row[2]}
+
+
+def select_messages():
+    return (
+        select(MessageInDB.id, MessageInDB.text, MessageInDB.chat_id, MessageInDB.created_at,
+               _author.id, _author.username, _author.email, _author.created_at)
+        .join(_author, _author.id == MessageInDB.user_id)
+    )
+
+
+def message_row(row) -> dict:
+    return {"id": row[0], "text": row[1], "chat_id": row[2], "user": user_row(row[4:8]), "created_at": row[3]}
+
+
+def json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> ORJSONResponse:
+    """Encode `content` with orjson, keeping headers already set on the route's `response`."""
+    headers = None
+    if response is not None:
+        headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
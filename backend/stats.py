@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from .schema import ChatStatsInDB, MessageInDB, UserChatLinkInDB
+
+
+def _backfill_chat_stats(session: Session, chat_id: int) -> ChatStatsInDB:
+    message_count, last_message_at = session.exec(
+        select(func.count(MessageInDB.id), func.max(MessageInDB.created_at)).where(MessageInDB.chat_id == chat_id)
+    ).one()
+    user_count = session.exec(
+        select(func.count(UserChatLinkInDB.user_id)).where(UserChatLinkInDB.chat_id == chat_id)
+    ).one()
+    # Concurrent requests may backfill the same chat; the first insert wins and the rest read it
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    session.connection().execute(dialect.insert(ChatStatsInDB.__table__).on_conflict_do_nothing(), {
+        "chat_id": chat_id,
+        "message_count": message_count,
+        "user_count": user_count,
+        "last_message_at": last_message_at,
+    })
+    return session.get(ChatStatsInDB, chat_id)
+
+
+def get_chat_stats(session: Session, chat_id: int) -> ChatStatsInDB:
+    """Counters for a chat, computed once with aggregate queries if they have never been stored."""
+    stats = session.get(ChatStatsInDB, chat_id)
+    if stats is None:
+        stats = _backfill_chat_stats(session, chat_id)
+        session.commit()
+    return stats
+
+
+def record_message(session: Session, chat_id: int, created_at: datetime, count: int = 1) -> None:
+    """Count new messages in the caller's transaction; call before the messages are added to the session."""
+    if session.get(ChatStatsInDB, chat_id) is None:
+        _backfill_chat_stats(session, chat_id)
+    session.exec(
+        update(ChatStatsInDB)
+        .where(ChatStatsInDB.chat_id == chat_id)
+        .values(message_count=ChatStatsInDB.message_count + count, last_message_at=created_at)
+    )
+
+
+def reset_chat_stats(session: Session) -> None:
+    """Drop stored counters after bulk writes so they are recomputed on next read."""
+    session.exec(delete(ChatStatsInDB))
+    session.commit()
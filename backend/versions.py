@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+from fastapi import Request, Response, status
+from sqlalchemy import and_, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from .schema import ChatInDB, EntityVersionInDB, UserInDB
+
+# A version key is (kind, entity_id). "chat" and "user" track single rows; "users" (id 0)
+# changes whenever any user profile does, for payloads that embed other users' profiles.
+VersionKey = Tuple[str, int]
+ALL_USERS: VersionKey = ("users", 0)
+
+entity_models = {
+    "chat": ChatInDB,
+    "user": UserInDB,
+}
+
+
+def _insert_missing(session: Session, keys) -> int:
+    # Concurrent requests may start tracking the same entity; the first insert wins
+    dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+    rows = [{"kind": kind, "entity_id": entity_id, "version": 1, "updated_at": datetime.utcnow()}
+            for kind, entity_id in keys]
+    statement = dialect.insert(EntityVersionInDB.__table__).on_conflict_do_nothing()
+    return session.connection().execute(statement, rows).rowcount
+
+
+def bump_version(session: Session, kind: str, entity_id: int = 0) -> None:
+    """Record a change in the caller's transaction."""
+    statement = (
+        update(EntityVersionInDB)
+        .where(EntityVersionInDB.kind == kind, EntityVersionInDB.entity_id == entity_id)
+        .values(version=EntityVersionInDB.version + 1, updated_at=datetime.utcnow())
+    )
+    if session.exec(statement).rowcount == 0 and _insert_missing(session, [(kind, entity_id)]) == 0:
+        session.exec(statement)
+
+
+def bump_all_versions(session: Session) -> None:
+    """Invalidate every ETag handed out so far, e.g. after bulk imports."""
+    session.exec(update(EntityVersionInDB).values(version=EntityVersionInDB.version + 1, updated_at=datetime.utcnow()))
+    session.commit()
+
+
+def _get_versions(session: Session, keys: Tuple[VersionKey, ...]) -> Optional[list]:
+    rows = session.exec(
+        # OR of key lookups rather than a row-value IN, which SQLite answers with a table scan
+        select(EntityVersionInDB).where(or_(*(
+            and_(EntityVersionInDB.kind == kind, EntityVersionInDB.entity_id == entity_id) for kind, entity_id in keys
+        )))
+    ).all()
+    found = {(row.kind, row.entity_id): row for row in rows}
+
+    missing = [key for key in keys if key not in found]
+    if not missing:
+        return [found[key] for key in keys]
+
+    # First read since versioning started; only start tracking entities that exist
+    for kind, entity_id in missing:
+        model = entity_models.get(kind)
+        if model is not None and session.get(model, entity_id) is None:
+            session.rollback()
+            return None
+    _insert_missing(session, missing)
+    session.commit()
+    return _get_versions(session, keys)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+def conditional_response(request: Request, response: Response, session: Session,
+                         *keys: VersionKey) -> Optional[Response]:
+    """Set ETag/Last-Modified from the versions of `keys` and return a 304 if the client is current.
+
+    Returns None when the handler should build the full response, including when an
+    entity does not exist so the handler can report it.
+    """
+    versions = _get_versions(session, keys)
+    if versions is None:
+        return None
+
+    etag = '"' + "-".join(f"{v.kind}{v.entity_id}.{v.version}" for v in versions) + '"'
+    last_modified = max(v.updated_at for v in versions).replace(microsecond=0)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    elif if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).astimezone(timezone.utc).replace(tzinfo=None)
+            not_modified = last_modified <= since
+        except (TypeError, ValueError):
+            not_modified = False
+    else:
+        not_modified = False
+
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,71 @@
+"""Measure Lambda cold starts: import, schema check and first invocation in fresh processes.
+
+    python -m benchmarks.cold_start --runs 10
+    python -m benchmarks.cold_start --runs 10 --eager   # eager crypto imports + full migration run
+
+Each run starts a new interpreter, imports backend.main and sends one API Gateway event
+through `lambda_handler` against a SQLite file created by the first run.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+event = {
+    "version": "2.0",
+    "routeKey": "$default",
+    "rawPath": "/chats",
+    "rawQueryString": "",
+    "headers": {"host": "cold-start.local"},
+    "requestContext": {
+        "http": {"method": "GET", "path": "/chats", "sourceIp": "127.0.0.1", "protocol": "HTTP/1.1"},
+        "stage": "$default",
+    },
+    "isBase64Encoded": False,
+}
+
+child = """
+import json, sys
+import backend
+eager = sys.argv[1] == "eager"
+if eager:
+    import jose.jwt, passlib.context  # noqa: F401
+from backend import coldstart, database
+if eager:
+    database.schema_is_current = lambda target: False
+from backend.main import lambda_handler
+response = lambda_handler(json.loads(sys.argv[2]), None)
+assert response["statusCode"] == 200, response
+print(json.dumps(coldstart.phases))
+"""
+
+
+def run_once(eager: bool, env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", child, "eager" if eager else "lazy", json.dumps(event)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--eager", action="store_true", help="import crypto eagerly and always run migrations")
+    args = parser.parse_args()
+
+    env = {**os.environ, "DB_ECHO": "false",
+           "DATABASE_URL": os.environ.get("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/cold.db")}
+    run_once(args.eager, env)  # creates the database so every measured run sees the same state
+    runs = [run_once(args.eager, env) for _ in range(args.runs)]
+
+    print(f"mode={'eager' if args.eager else 'lazy'} runs={args.runs} (median ms)")
+    for phase in runs[0]:
+        print(f"{phase}: {statistics.median(run[phase] for run in runs) * 1000:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Drive the key API flows concurrently and record throughput and latency percentiles.
+
+    python -m benchmarks.load_test --users 200 --chats 50 --duration 30 --output results.json
+    python -m benchmarks.load_test --baseline results.json   # exit 1 on regression
+    python -m benchmarks.load_test --base-url http://localhost:8000 --no-seed
+
+By default the app runs in-process through httpx's ASGI transport against a freshly seeded
+throwaway SQLite file. With --base-url requests go to a running server instead; seed its
+database first with `python -m benchmarks.seed` using the same sizes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/load.db")
+os.environ.setdefault("DB_ECHO", "false")
+# Every virtual user shares one client address; measure the server, not the per-IP budgets
+os.environ.setdefault("RATE_LIMITING", "false")
+
+import httpx  # noqa: E402
+
+from benchmarks.seed import SeedSize, add_size_arguments, chat_members, password, seed, size_from_arguments, \
+    username  # noqa: E402
+
+# Relative frequency of each flow in the mix
+flow_weights = {"login": 1, "list_chats": 4, "read_messages": 10, "post_message": 3}
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))]
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, user_id: int, size: SeedSize, rng: random.Random):
+        self.client = client
+        self.user_id = user_id
+        self.chat_ids = [chat_id for chat_id in range(1, size.chats + 1) if user_id in chat_members(chat_id, size)]
+        self.rng = rng
+        self.headers = {}
+
+    async def login(self):
+        response = await self.client.post("/auth/token", data={"username": username(self.user_id), "password": password})
+        if response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    async def list_chats(self):
+        return await self.client.get(f"/users/{self.user_id}/chats")
+
+    async def read_messages(self):
+        return await self.client.get(f"/chats/{self.rng.choice(self.chat_ids)}/messages")
+
+    async def post_message(self):
+        chat_id = self.rng.choice(self.chat_ids)
+        return await self.client.post(f"/chats/{chat_id}/messages", json={"text": "load test"}, headers=self.headers)
+
+
+async def run(client: httpx.AsyncClient, size: SeedSize, concurrency: int, duration: float, seed_value: int) -> dict:
+    latencies, errors = defaultdict(list), defaultdict(int)
+    rng = random.Random(seed_value)
+    # Only users that belong to a chat can read and post
+    candidates = sorted({user_id for chat_id in range(1, size.chats + 1) for user_id in chat_members(chat_id, size)})
+    flows, weights = zip(*flow_weights.items())
+
+    async def timed(name, request):
+        start = time.perf_counter()
+        try:
+            response = await request()
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        latencies[name].append((time.perf_counter() - start) * 1000)
+        if failed:
+            errors[name] += 1
+
+    async def worker(index: int):
+        user = VirtualUser(client, candidates[index % len(candidates)], size, random.Random(seed_value + index))
+        await timed("login", user.login)
+        while time.perf_counter() < deadline:
+            flow = rng.choices(flows, weights)[0]
+            await timed(flow, getattr(user, flow))
+
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for name in flows:
+        values = sorted(latencies[name])
+        results[name] = {
+            "requests": len(values),
+            "errors": errors[name],
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 0.50), 2),
+            "p95_ms": round(percentile(values, 0.95), 2),
+            "p99_ms": round(percentile(values, 0.99), 2),
+        }
+    total = sum(flow["requests"] for flow in results.values())
+    return {"total_rps": round(total / elapsed, 1), "seconds": round(elapsed, 2), "flows": results}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of `results` against `baseline`: p95 latency up, or throughput down, by more than `tolerance`."""
+    regressions = []
+    for name, flow in results["flows"].items():
+        before = baseline.get("flows", {}).get(name)
+        if not before or not before["requests"]:
+            continue
+        if flow["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} ms -> {flow['p95_ms']} ms")
+        if flow["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {before['rps']} -> {flow['rps']} requests/s")
+        if flow["errors"] > before["errors"]:
+            regressions.append(f"{name}: {before['errors']} -> {flow['errors']} errors")
+    return regressions
+
+
+async def main_async(args: argparse.Namespace, size: SeedSize) -> dict:
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=30)
+    else:
+        from backend.main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test", timeout=30)
+    async with client:
+        return await run(client, size, args.concurrency, args.duration, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_size_arguments(parser)
+    parser.add_argument("--concurrency", type=int, default=16, help="number of virtual users")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run the mix for")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the request mix")
+    parser.add_argument("--base-url", help="target a running server instead of the in-process app")
+    parser.add_argument("--no-seed", action="store_true", help="the database is already seeded")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    args = parser.parse_args()
+    size = size_from_arguments(args)
+
+    if not args.no_seed:
+        from backend.database import migrate_database, engine
+
+        migrate_database()
+        print(f"seeded {seed(engine, size)}", file=sys.stderr)
+
+    results = {"config": {**vars(size), "concurrency": args.concurrency, "duration": args.duration},
+               **asyncio.run(main_async(args, size))}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
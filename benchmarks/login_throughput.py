@@ -0,0 +1,85 @@
+"""Measure login throughput and event loop lag for a single worker.
+
+    python -m benchmarks.login_throughput --logins 64 --concurrency 16
+    python -m benchmarks.login_throughput --blocking   # verify on the event loop, as before
+
+Runs the app in-process through httpx's ASGI transport against a throwaway SQLite file.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+os.environ.setdefault("DB_ECHO", "false")
+# Every virtual user shares one client address; measure the server, not the per-IP budgets
+os.environ.setdefault("RATE_LIMITING", "false")
+
+import httpx  # noqa: E402
+
+from backend import auth  # noqa: E402
+from backend.database import migrate_database  # noqa: E402
+from backend.main import app  # noqa: E402
+
+
+async def _verify_on_loop(plain_password, hashed_password):
+    return auth.pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+async def probe_loop_lag(stop: asyncio.Event, samples: list, interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+async def run(logins: int, concurrency: int) -> dict:
+    credentials = {"username": "bench", "password": "bench-password"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/auth/registration", json={**credentials, "email": "bench@example.com"})
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def login():
+            async with semaphore:
+                response = await client.post("/auth/token", data=credentials)
+                response.raise_for_status()
+
+        stop, lag = asyncio.Event(), []
+        prober = asyncio.create_task(probe_loop_lag(stop, lag))
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+
+    return {
+        "logins_per_second": logins / elapsed,
+        "loop_lag_p50_ms": statistics.median(lag) * 1000 if lag else 0.0,
+        "loop_lag_max_ms": max(lag) * 1000 if lag else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--blocking", action="store_true", help="verify passwords on the event loop")
+    args = parser.parse_args()
+
+    if args.blocking:
+        auth.verify_and_update_password = _verify_on_loop
+
+    migrate_database()
+    result = asyncio.run(run(args.logins, args.concurrency))
+    mode = "blocking" if args.blocking else f"pool({auth.password_hash_workers})"
+    print(f"mode={mode} rounds={auth.bcrypt_rounds} logins={args.logins} concurrency={args.concurrency}")
+    for key, value in result.items():
+        print(f"{key}: {value:.1f}")
+
+
+if __name__ == "__main__":
+    main()
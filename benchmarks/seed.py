@@ -0,0 +1,113 @@
+"""Generate a synthetic Pony Express database of a given size.
+
+    python -m benchmarks.seed --users 1000 --chats 200 --messages-per-chat 500
+
+Writes to the database named by DATABASE_URL. Every user shares `password`, hashed once,
+so seeding stays fast even with a high bcrypt cost.
+"""
+import argparse
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+
+from backend.auth import get_password_hash
+from backend.inbox import rebuild_inbox
+from backend.lookups import clear_caches
+from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB, UserInDB
+from backend.stats import reset_chat_stats
+from backend.versions import bump_all_versions
+
+password = "bench-password"
+insert_batch_size = 5000
+
+
+@dataclass
+class SeedSize:
+    users: int = 100
+    chats: int = 20
+    members_per_chat: int = 10
+    messages_per_chat: int = 200
+
+
+def username(user_id: int) -> str:
+    return f"user{user_id}"
+
+
+def chat_members(chat_id: int, size: SeedSize) -> list:
+    """Ids of the users in a chat: its owner followed by the next users in id order."""
+    owner_id = (chat_id - 1) % size.users + 1
+    return [(owner_id - 1 + offset) % size.users + 1 for offset in range(min(size.members_per_chat, size.users))]
+
+
+def _insert(engine: Engine, table, rows) -> None:
+    with engine.begin() as connection:
+        for start in range(0, len(rows), insert_batch_size):
+            connection.execute(insert(table), rows[start:start + insert_batch_size])
+
+
+def seed(engine: Engine, size: SeedSize) -> dict:
+    """Fill an empty database; ids start at 1 so `chat_members` can be used to pick requests."""
+    start_time = time.perf_counter()
+    hashed_password = get_password_hash(password)
+    epoch = datetime(2024, 1, 1)
+
+    _insert(engine, UserInDB.__table__, [
+        {"id": user_id, "username": username(user_id), "email": f"{username(user_id)}@example.com",
+         "hashed_password": hashed_password, "created_at": epoch}
+        for user_id in range(1, size.users + 1)
+    ])
+    _insert(engine, ChatInDB.__table__, [
+        {"id": chat_id, "name": f"chat {chat_id}", "owner_id": chat_members(chat_id, size)[0], "created_at": epoch}
+        for chat_id in range(1, size.chats + 1)
+    ])
+    _insert(engine, UserChatLinkInDB.__table__, [
+        {"user_id": user_id, "chat_id": chat_id}
+        for chat_id in range(1, size.chats + 1)
+        for user_id in chat_members(chat_id, size)
+    ])
+    for chat_id in range(1, size.chats + 1):
+        members = chat_members(chat_id, size)
+        _insert(engine, MessageInDB.__table__, [
+            {"text": f"message {n} in chat {chat_id}", "user_id": members[n % len(members)], "chat_id": chat_id,
+             "created_at": epoch + timedelta(seconds=n)}
+            for n in range(size.messages_per_chat)
+        ])
+
+    with Session(engine) as session:
+        reset_chat_stats(session)
+        rebuild_inbox(session)
+        bump_all_versions(session)
+    clear_caches()
+
+    return {**asdict(size), "seconds": round(time.perf_counter() - start_time, 2)}
+
+
+def add_size_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = SeedSize()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--chats", type=int, default=defaults.chats)
+    parser.add_argument("--members-per-chat", type=int, default=defaults.members_per_chat)
+    parser.add_argument("--messages-per-chat", type=int, default=defaults.messages_per_chat)
+
+
+def size_from_arguments(args: argparse.Namespace) -> SeedSize:
+    return SeedSize(args.users, args.chats, args.members_per_chat, args.messages_per_chat)
+
+
+def main():
+    from backend.database import migrate_database, engine
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    migrate_database()
+    print(seed(engine, size_from_arguments(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare ORM + Pydantic serialization with the column-row + orjson fast path.
+
+    python -m benchmarks.serialization --messages 10000 --runs 30
+
+Serializes every message of one chat the way list endpoints used to (ORM objects,
+`from_orm` per row, `response_model` re-validation, `jsonable_encoder` + json) and the way
+they do now (column tuples to dicts, encoded with orjson), reporting p50/p99 per request.
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import joinedload
+from sqlmodel import Session, SQLModel, StaticPool, create_engine, select
+
+from backend.models import MessagePublic, MessagesMeta, MessagesResponse
+from backend.schema import ChatInDB, MessageInDB, UserInDB
+from backend.serialization import message_row, select_messages
+
+
+def seed(session: Session, message_count: int, user_count: int = 20) -> int:
+    users = [UserInDB(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x") for i in range(user_count)]
+    chat = ChatInDB(name="bench", owner=users[0])
+    session.add_all(users + [chat])
+    session.commit()
+    start = datetime(2024, 1, 1)
+    session.add_all(
+        MessageInDB(text=f"message number {i} " * 4, user_id=users[i % user_count].id, chat_id=chat.id,
+                    created_at=start + timedelta(seconds=i))
+        for i in range(message_count)
+    )
+    session.commit()
+    return chat.id
+
+
+def orm_pipeline(session: Session, chat_id: int) -> bytes:
+    messages = session.exec(
+        select(MessageInDB).where(MessageInDB.chat_id == chat_id).options(joinedload(MessageInDB.user))
+    ).all()
+    result = [MessagePublic.from_orm(message) for message in messages]
+    response = MessagesResponse(meta=MessagesMeta(count=len(result)), messages=result)
+    validated = MessagesResponse.model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def column_pipeline(session: Session, chat_id: int) -> bytes:
+    messages = [message_row(row) for row in session.exec(select_messages().where(MessageInDB.chat_id == chat_id))]
+    return orjson.dumps({"meta": {"count": len(messages)}, "messages": messages})
+
+
+def measure(pipeline, engine, chat_id: int, runs: int) -> dict:
+    timings = []
+    for _ in range(runs):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            pipeline(session, chat_id)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings),
+        "p99_ms": timings[min(len(timings) - 1, round(0.99 * (len(timings) - 1)))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        chat_id = seed(session, args.messages)
+
+    print(f"messages={args.messages} runs={args.runs}")
+    for name, pipeline in [("orm+pydantic", orm_pipeline), ("columns+orjson", column_pipeline)]:
+        result = measure(pipeline, engine, chat_id, args.runs)
+        print(f"{name}: p50={result['p50_ms']:.1f} ms p99={result['p99_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Microbenchmarks for hot paths, run with pytest-benchmark.
+
+    pytest benchmarks/ --benchmark-autosave
+    pytest benchmarks/ --benchmark-compare --benchmark-compare-fail=mean:20%
+
+A plain `pytest` only collects `tests/` (see `testpaths`), so these run only when named, and
+are skipped when pytest-benchmark is not installed.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlmodel import Session, SQLModel, StaticPool, create_engine  # noqa: E402
+
+from backend import database as db, lookups  # noqa: E402
+from backend.auth import access_token_claims, create_access_token, decode_access_token, token_cache  # noqa: E402
+from backend.main import app  # noqa: E402
+from backend.pagination import decode_cursor, encode_cursor  # noqa: E402
+from backend.schema import UserInDB  # noqa: E402
+from benchmarks.seed import SeedSize, seed  # noqa: E402
+
+size = SeedSize(users=200, chats=20, members_per_chat=20, messages_per_chat=500)
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    seed(engine, size)
+    return engine
+
+
+@pytest.fixture(scope="module")
+def client(engine):
+    def _get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[db.get_session] = _get_session_override
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_read_messages_page(benchmark, client):
+    response = benchmark(client.get, "/chats/1/messages")
+    assert response.status_code == 200
+
+
+def test_list_user_chats_cold_cache(benchmark, client):
+    def list_chats():
+        lookups.clear_caches()
+        return client.get("/users/1/chats")
+
+    assert benchmark(list_chats).status_code == 200
+
+
+def test_list_user_chats_warm_cache(benchmark, client):
+    assert benchmark(client.get, "/users/1/chats").status_code == 200
+
+
+def test_search_messages(benchmark, client):
+    response = benchmark(client.get, "/search/messages", params={"q": "message chat"})
+    assert response.status_code == 200
+
+
+def test_decode_access_token_uncached(benchmark, engine):
+    with Session(engine) as session:
+        token = create_access_token(data=access_token_claims(session.get(UserInDB, 1)), expires_delta=timedelta(hours=1))
+
+    def decode():
+        token_cache.clear()
+        return decode_access_token(token)
+
+    assert benchmark(decode)["sub"] == "1"
+
+
+def test_cursor_round_trip(benchmark):
+    cursor = encode_cursor(datetime(2024, 1, 1), 1234)
+    assert benchmark(decode_cursor, cursor) == (datetime(2024, 1, 1), 1234)
@@ -1,6 +1,26 @@
-import {useMutation, useQuery, useQueryClient} from "react-query";
+import {useInfiniteQuery, useMutation, useQueryClient} from "react-query";
 import { useParams } from "react-router-dom";
 import { useApi } from "../hooks";
+import { baseUrl } from "../utils/api";
+
+// Pages are newest first, each holding its messages oldest first
+const addMessage = (data, message) => {
+    if (!data || data.pages.some((page) => page.messages.some((m) => m.id === message.id))) {
+        return data;
+    }
+    const [newest, ...older] = data.pages;
+    return {
+        ...data,
+        pages: [
+            {
+                ...newest,
+                meta: { ...newest.meta, count: newest.meta.count + 1 },
+                messages: [...newest.messages, message],
+            },
+            ...older,
+        ],
+    };
+};
 
 function Message({ message }) {
     const className = "flex flex-col p-2 border-b border-slate-300";
@@ -28,19 +48,31 @@ function NoMessages() {
 
 import React, {useEffect, useRef, useState} from 'react';
 
-function ChatMessages({ messages }) {
+function ChatMessages({ messages, hasOlder, loadOlder, isLoadingOlder }) {
     const messagesEndRef = useRef(null);
     const messagesContainerRef = useRef(null);
+    const lastMessageId = messages?.length ? messages[messages.length - 1].id : null;
 
+    // Follow new messages, but stay put when older ones are loaded above
     useEffect(() => {
         if (messagesEndRef.current && messagesContainerRef.current) {
             messagesContainerRef.current.scrollTop = messagesContainerRef.current.scrollHeight;
         }
-    }, [messages]);
+    }, [lastMessageId]);
 
     if (messages && messages.length > 0) {
         return (
             <div ref={messagesContainerRef} className="flex flex-col p-4 overflow-y-auto h-full">
+                {hasOlder && (
+                    <button
+                        type="button"
+                        onClick={loadOlder}
+                        disabled={isLoadingOlder}
+                        className="p-2 text-blue-500 hover:underline"
+                    >
+                        {isLoadingOlder ? "Loading..." : "Load older messages"}
+                    </button>
+                )}
                 {messages.map((message) => (
                     <Message key={message.id} message={message} />
                 ))}
@@ -57,10 +89,10 @@ function SendMessageForm({ chatId, api }) {
     const queryClient = useQueryClient();
 
     const mutation = useMutation(
-        (message) => api.post(`/chats/${chatId}/messages`, message),
+        (message) => api.post(`/chats/${chatId}/messages`, message).then((response) => response.json()),
         {
-            onSuccess: async () => {
-                await queryClient.invalidateQueries(["chats", chatId, "messages"]);
+            onSuccess: (body) => {
+                queryClient.setQueryData(["chats", chatId, "messages"], (data) => addMessage(data, body.message));
             },
         }
     );
@@ -96,18 +128,118 @@ function SendMessageForm({ chatId, api }) {
     );
 }
 
+const maxReconnectDelay = 30000;
+const pollInterval = 10000;
+
+// Live updates over the chat websocket, or the SSE stream where websockets are not served
+// (e.g. behind API Gateway). Returns whether a connection is up; while it is not, the caller
+// polls instead. Every (re)connect refetches, since events sent while disconnected are lost.
+function useChatEvents(chatId) {
+    const queryClient = useQueryClient();
+    const [live, setLive] = useState(false);
+
+    useEffect(() => {
+        if (!chatId) {
+            return;
+        }
+
+        let stopped = false;
+        let socket = null;
+        let source = null;
+        let reconnectTimer = null;
+        let attempts = 0;
+
+        const handleEvent = (payload) => {
+            if (payload.type === "message") {
+                queryClient.setQueryData(["chats", chatId, "messages"], (data) => addMessage(data, payload.message));
+                queryClient.invalidateQueries(["inbox"]);
+            }
+        };
+
+        const connected = () => {
+            setLive(true);
+            queryClient.invalidateQueries(["chats", chatId, "messages"]);
+        };
+
+        const listenForEvents = () => {
+            // EventSource reconnects by itself; onopen fires again each time it does
+            source = new EventSource(`${baseUrl}/chats/${chatId}/events`);
+            source.onopen = connected;
+            source.onerror = () => setLive(false);
+            source.addEventListener("message", (event) => handleEvent(JSON.parse(event.data)));
+        };
+
+        const connect = (everOpened) => {
+            socket = new WebSocket(`${baseUrl.replace(/^http/, "ws")}/chats/${chatId}/ws`);
+            socket.onopen = () => {
+                everOpened = true;
+                attempts = 0;
+                connected();
+            };
+            socket.onmessage = (event) => handleEvent(JSON.parse(event.data));
+            socket.onclose = () => {
+                setLive(false);
+                if (stopped) {
+                    return;
+                }
+                if (!everOpened) {
+                    // The server does not accept websockets at all
+                    listenForEvents();
+                    return;
+                }
+                const delay = Math.min(1000 * 2 ** attempts, maxReconnectDelay);
+                attempts += 1;
+                reconnectTimer = setTimeout(() => connect(true), delay);
+            };
+        };
+
+        connect(false);
+
+        return () => {
+            stopped = true;
+            clearTimeout(reconnectTimer);
+            socket?.close();
+            source?.close();
+        };
+    }, [chatId, queryClient]);
+
+    return live;
+}
+
+function useMarkRead(chatId, messages, api) {
+    const queryClient = useQueryClient();
+    const lastMessageId = messages?.length ? messages[messages.length - 1].id : null;
+
+    useEffect(() => {
+        if (!chatId || !lastMessageId) {
+            return;
+        }
+        // Read receipts are best effort; a failure only leaves the badge up
+        api.post(`/chats/${chatId}/read`, { message_id: lastMessageId })
+            .then(() => queryClient.invalidateQueries(["inbox"]))
+            .catch(() => {});
+    }, [chatId, lastMessageId]);
+}
+
 function Chat() {
     const { chatId } = useParams();
     const api = useApi();
+    const live = useChatEvents(chatId);
 
-    const { data, isLoading, isError, error } = useQuery({
+    const {
+        data, isLoading, isError, error, hasNextPage, fetchNextPage, isFetchingNextPage,
+    } = useInfiniteQuery({
         queryKey: ["chats", chatId, "messages"],
-        queryFn: () => (
-            api.get(`/chats/${chatId}/messages`)
+        queryFn: ({ pageParam }) => (
+            api.get(`/chats/${chatId}/messages` + (pageParam ? `?before=${encodeURIComponent(pageParam)}` : ""))
                 .then((response) => response.json())
         ),
+        getNextPageParam: (page) => page.meta.next_cursor ?? undefined,
         enabled: !!chatId,
+        refetchInterval: live ? false : pollInterval,
     });
+    const messages = data?.pages.slice().reverse().flatMap((page) => page.messages);
+    useMarkRead(chatId, messages, api);
 
     if (isLoading) {
         return <div className="text-center text-xl">Loading...</div>;
@@ -119,7 +251,12 @@ function Chat() {
 
     return (
         <div className="flex flex-col h-full">
-            <ChatMessages messages={data?.messages} />
+            <ChatMessages
+                messages={messages}
+                hasOlder={hasNextPage}
+                loadOlder={() => fetchNextPage()}
+                isLoadingOlder={isFetchingNextPage}
+            />
             <SendMessageForm chatId={chatId} api={api} />
         </div>
     );
@@ -1,39 +1,63 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { NavLink } from "react-router-dom";
-import { useQuery } from "react-query";
+import { useInfiniteQuery } from "react-query";
 import { useApi } from "../hooks";
 
-function ChatLink({ chat }) {
-    const url = `/chats/${chat.id}`;
+function ChatLink({ entry }) {
+    const url = `/chats/${entry.chat_id}`;
     const className = ({ isActive }) => [
         "p-2",
         "hover:bg-slate-500 hover:text-white",
-        "flex flex-row justify-between",
+        "flex flex-col",
         isActive ? "bg-slate-600 text-white font-bold" : ""
     ].join(" ");
 
-    const chatName = ({ isActive }) => (
-        (isActive ? "\u00bb " : "") + chat.name
-    );
-
     return (
         <NavLink to={url} className={className}>
-            {chatName}
+            {({ isActive }) => (
+                <>
+                    <div className="flex flex-row justify-between">
+                        <span>{(isActive ? "\u00bb " : "") + entry.chat_name}</span>
+                        {entry.unread_count > 0 && (
+                            <span className="px-2 rounded-full bg-blue-500 text-white text-sm">
+                                {entry.unread_count}
+                            </span>
+                        )}
+                    </div>
+                    {entry.last_message && (
+                        <div className="text-sm text-gray-400 font-normal truncate">
+                            {entry.last_message.user.username}: {entry.last_message.text}
+                        </div>
+                    )}
+                </>
+            )}
         </NavLink>
     );
 }
 
+// The largest page /users/me/inbox serves
+const inboxPageSize = 200;
+
 function LeftNav() {
     const [search, setSearch] = useState("");
     const api = useApi();
 
-    const { data, isLoading, isError, error } = useQuery({
-        queryKey: ["chats"],
-        queryFn: () => (
-            api.get("/chats").then((response) => response.json())
+    const { data, isLoading, isError, error, hasNextPage, fetchNextPage, isFetchingNextPage } = useInfiniteQuery({
+        queryKey: ["inbox"],
+        queryFn: ({ pageParam }) => (
+            api.get(`/users/me/inbox?limit=${inboxPageSize}` + (pageParam ? `&before=${encodeURIComponent(pageParam)}` : ""))
+                .then((response) => response.json())
         ),
+        getNextPageParam: (page) => page.meta.next_cursor ?? undefined,
     });
 
+    // The nav lists every chat, so keep paging until the inbox is exhausted
+    useEffect(() => {
+        if (hasNextPage && !isFetchingNextPage) {
+            fetchNextPage();
+        }
+    }, [hasNextPage, isFetchingNextPage, fetchNextPage]);
+
     if (isLoading) {
         return <div className="p-2 text-white">Loading chats...</div>;
     }
@@ -43,9 +67,9 @@ function LeftNav() {
     }
 
     const regex = new RegExp(search.split("").join(".*"), 'i');
-    const chats = data?.chats || [];
+    const entries = data?.pages.flatMap((page) => page.entries) || [];
 
-    const filteredChats = chats.filter(chat => search === "" || regex.test(chat.name));
+    const filteredEntries = entries.filter(entry => search === "" || regex.test(entry.chat_name));
 
     return (
         <nav className="flex flex-col w-full border-r border-gray-700 bg-gray-800 text-white h-full">
@@ -58,8 +82,8 @@ function LeftNav() {
                 />
             </div>
             <div className="flex-1 overflow-y-auto">
-                {filteredChats.map(chat => (
-                    <ChatLink key={chat.id} chat={chat} />
+                {filteredEntries.map(entry => (
+                    <ChatLink key={entry.chat_id} entry={entry} />
                 ))}
             </div>
         </nav>
@@ -1,6 +1,6 @@
-const api = (token) => {
-    const baseUrl = import.meta.env.VITE_API_BASE_URL || "http://127.0.0.1:8000";
+const baseUrl = import.meta.env.VITE_API_BASE_URL || "http://127.0.0.1:8000";
 
+const api = (token) => {
     const headers = {
         "Content-Type": "application/json",
     };
@@ -55,4 +55,5 @@ const api = (token) => {
     return { get, post, postForm, put };
 };
 
+export { baseUrl };
 export default api;
\ No newline at end of file
@@ -1,9 +1,30 @@
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlmodel import Session, SQLModel, StaticPool, create_engine
 
+from backend.auth import get_current_user, get_current_user_id
 from backend.main import app
 from backend import database as db
+from backend import lookups, ratelimit
+from backend.schema import ChatInDB, UserInDB
+
+
+class QueryCounter:
+    """Records the SQL statements sent to the test database."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def reset(self):
+        self.statements.clear()
 
 
 @pytest.fixture
@@ -24,7 +45,94 @@ def client(session):
         return session
 
     app.dependency_overrides[db.get_session] = _get_session_override
+    lookups.clear_caches()
+    ratelimit.reset()
 
     yield TestClient(app)
 
-    app.dependency_overrides.clear()
\ No newline at end of file
+    app.dependency_overrides.clear()
+    lookups.clear_caches()
+    ratelimit.reset()
+
+
+@pytest.fixture
+def chat(session):
+    """The chat nostromo, owned by juniper, its only member."""
+    owner = UserInDB(username="juniper", email="juniper@cat.com", hashed_password="x")
+    chat = ChatInDB(name="nostromo", owner=owner, users=[owner])
+    session.add(chat)
+    session.commit()
+    return chat
+
+
+@pytest.fixture
+def as_owner(chat):
+    """Authenticate requests as the chat's owner."""
+    owner = chat.owner
+    app.dependency_overrides[get_current_user_id] = lambda: owner.id
+    app.dependency_overrides[get_current_user] = lambda: owner
+    yield owner
+    app.dependency_overrides.pop(get_current_user_id, None)
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.fixture
+def users(session):
+    """juniper, sarah and ripley, in no chats yet."""
+    users = [
+        UserInDB(username="juniper", email="juniper@cat.com", hashed_password="x"),
+        UserInDB(username="sarah", email="sarah@hotmail.com", hashed_password="x"),
+        UserInDB(username="ripley", email="ripley@nostromo.com", hashed_password="x"),
+    ]
+    session.add_all(users)
+    session.commit()
+    return users
+
+
+@pytest.fixture
+def post_message(client):
+    """Post `text` to `chat` as `user` through the API and return the created message."""
+
+    def post(user, chat, text):
+        user_id = user.id
+        app.dependency_overrides[get_current_user_id] = lambda: user_id
+        response = client.post(f"/chats/{chat.id}/messages", json={"text": text})
+        assert response.status_code == 201, response.text
+        return response.json()["message"]
+
+    return post
+
+
+@pytest.fixture
+def query_counter(session):
+    counter = QueryCounter()
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter)
+
+
+@pytest.fixture
+def assert_constant_queries(client, session, query_counter):
+    """Fail if `url` issues more queries after `grow` adds rows, i.e. on N+1 regressions."""
+
+    def check(url, grow, **params):
+        def queries_for_request():
+            # Start from an empty identity map and cold caches, like a fresh request would
+            session.expunge_all()
+            lookups.clear_caches()
+            query_counter.reset()
+            response = client.get(url, params=params)
+            assert response.status_code == 200, response.text
+            return query_counter.count, response.json()
+
+        # Warm up first so one-off work (lazily created rows, caches) is not counted
+        queries_for_request()
+        before, small = queries_for_request()
+        grow()
+        session.commit()
+        after, large = queries_for_request()
+        assert after == before, f"{url} issued {before} queries before and {after} after adding rows"
+        return small, large
+
+    return check
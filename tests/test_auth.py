@@ -0,0 +1,99 @@
+import pytest
+from jose import jwt
+from passlib.context import CryptContext
+
+from backend import auth
+from backend.schema import UserInDB
+from backend.versions import bump_version
+
+
+def _context(rounds):
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+@pytest.fixture(autouse=True)
+def fast_hashing(monkeypatch):
+    monkeypatch.setattr(auth, "pwd_context", _context(4))
+
+
+def _register(client, username="juniper", password="hunter2"):
+    return client.post("/auth/registration", json={
+        "username": username,
+        "email": f"{username}@cat.com",
+        "password": password,
+    })
+
+
+def test_login_with_valid_credentials(client):
+    assert _register(client).status_code == 201
+
+    response = client.post("/auth/token", data={"username": "juniper", "password": "hunter2"})
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "Bearer"
+
+
+def test_login_with_invalid_password(client):
+    _register(client)
+
+    response = client.post("/auth/token", data={"username": "juniper", "password": "wrong"})
+    assert response.status_code == 401
+    assert response.json()["detail"]["error"] == "invalid_client"
+
+
+def test_login_rehashes_when_cost_changes(client, session, monkeypatch):
+    _register(client)
+    old_hash = session.get(UserInDB, 1).hashed_password
+    assert old_hash.startswith("$2b$04$")
+
+    monkeypatch.setattr(auth, "pwd_context", _context(5))
+    response = client.post("/auth/token", data={"username": "juniper", "password": "hunter2"})
+    assert response.status_code == 200
+
+    session.expire_all()
+    new_hash = session.get(UserInDB, 1).hashed_password
+    assert new_hash.startswith("$2b$05$")
+    assert auth.verify_password("hunter2", new_hash)
+
+
+@pytest.fixture
+def token(client):
+    auth.principal_cache.clear()
+    _register(client)
+    response = client.post("/auth/token", data={"username": "juniper", "password": "hunter2"})
+    return response.json()["access_token"]
+
+
+def test_get_current_user_is_served_from_principal_cache(client, session, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users/me", headers=headers).json()["user"]["username"] == "juniper"
+    assert auth.principal_cache.get(1) is not None
+
+    # A change made by another worker: the cached principal still authenticates the request,
+    # but the body follows the new ETag rather than the cached profile
+    session.get(UserInDB, 1).username = "bishop"
+    bump_version(session, "user", 1)
+    session.commit()
+    response = client.get("/users/me", headers=headers)
+    assert response.json()["user"]["username"] == "bishop"
+    assert response.headers["etag"] == '"user1.2"'
+    assert auth.principal_cache.get(1)["username"] == "juniper"
+
+
+def test_update_current_user_invalidates_principal_cache(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/users/me", headers=headers)
+
+    response = client.put("/users/me", json={"username": "bishop"}, headers=headers)
+    assert response.status_code == 200
+    assert client.get("/users/me", headers=headers).json()["user"]["username"] == "bishop"
+
+
+def test_invalid_token_is_rejected(client):
+    response = client.get("/users/me", headers={"Authorization": "Bearer not-a-token"})
+    assert response.status_code == 401
+
+
+def test_token_without_expiry_is_rejected(client):
+    token = jwt.encode({"sub": "1"}, auth.jwt_key, algorithm=auth.jwt_alg)
+    response = client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
@@ -0,0 +1,41 @@
+import pytest
+
+from backend.schema import MessageInDB
+from sqlmodel import select
+
+pytestmark = pytest.mark.usefixtures("as_owner")
+
+def test_create_messages_batch(client, session, chat):
+    response = client.post(f"/chats/{chat.id}/messages:batch", json=[{"text": "one"}, {"text": "two"}])
+    assert response.status_code == 201
+    body = response.json()
+    assert body["meta"] == {"count": 2, "error_count": 0}
+    assert [m["text"] for m in body["messages"]] == ["one", "two"]
+    assert body["messages"][0]["user"]["username"] == "juniper"
+
+    assert len(session.exec(select(MessageInDB)).all()) == 2
+    assert client.get(f"/chats/{chat.id}").json()["meta"]["message_count"] == 2
+
+
+def test_create_messages_batch_reports_invalid_items(client, session, chat):
+    response = client.post(f"/chats/{chat.id}/messages:batch", json=[{"text": "one"}, {"body": "two"}, "three"])
+    assert response.status_code == 201
+    body = response.json()
+    assert body["meta"] == {"count": 1, "error_count": 2}
+    assert [error["index"] for error in body["errors"]] == [1, 2]
+
+
+def test_create_messages_batch_all_invalid(client, chat):
+    response = client.post(f"/chats/{chat.id}/messages:batch", json=[{"body": "two"}])
+    assert response.status_code == 422
+    assert response.json()["detail"]["type"] == "invalid_batch"
+
+
+def test_create_messages_batch_too_large(client, chat):
+    response = client.post(f"/chats/{chat.id}/messages:batch", json=[{"text": "x"}] * 1001)
+    assert response.status_code == 422
+
+
+def test_create_messages_batch_invalid_chat(client, chat):
+    response = client.post("/chats/999/messages:batch", json=[{"text": "one"}])
+    assert response.status_code == 404
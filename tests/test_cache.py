@@ -0,0 +1,108 @@
+from backend import lookups
+from backend.cache import ReadThroughCache, RedisBackend, TTLCache
+from backend.versions import bump_version
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the subset of the redis-py client `RedisBackend` uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.data) if key.startswith(match.rstrip("*"))]
+
+
+def test_read_through_cache_counts_hits_and_misses():
+    cache = ReadThroughCache("test", TTLCache())
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {"value": 1}
+
+    assert cache.get(1, load) == {"value": 1}
+    assert cache.get(1, load) == {"value": 1}
+    assert len(loads) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_get_many_loads_only_missing_keys():
+    cache = ReadThroughCache("test", TTLCache())
+    cache.get_many([1], lambda missing: {key: key * 10 for key in missing})
+
+    requested = []
+
+    def load(missing):
+        requested.extend(missing)
+        return {key: key * 10 for key in missing}
+
+    assert cache.get_many([1, 2, 3], load) == {1: 10, 2: 20, 3: 30}
+    assert requested == [2, 3]
+
+
+def test_redis_backend_round_trips_json():
+    backend = RedisBackend(FakeRedis(), prefix="test:")
+    backend.set("chat:1", {"id": 1, "name": "nostromo"})
+    assert backend.get("chat:1") == {"id": 1, "name": "nostromo"}
+
+    backend.clear()
+    assert backend.get("chat:1") is None
+
+
+def test_chat_reads_are_served_from_cache(client, chat, query_counter):
+    client.get(f"/chats/{chat.id}/users")
+    query_counter.reset()
+    response = client.get(f"/chats/{chat.id}/users")
+
+    assert response.json()["users"][0]["username"] == "juniper"
+    assert not any("FROM users" in statement for statement in query_counter.statements)
+    assert lookups.chat_members_cache.hits >= 1
+
+
+def test_update_chat_invalidates_cached_chat(client, chat):
+    assert client.get(f"/chats/{chat.id}").json()["chat"]["name"] == "nostromo"
+    client.put(f"/chats/{chat.id}", json={"name": "sulaco"})
+
+    assert client.get(f"/chats/{chat.id}").json()["chat"]["name"] == "sulaco"
+    assert client.get(f"/users/{chat.owner_id}/chats").json()["chats"][0]["name"] == "sulaco"
+
+
+def test_update_current_user_invalidates_cached_profile(client, chat, as_owner):
+    assert client.get(f"/chats/{chat.id}/users").json()["users"][0]["username"] == "juniper"
+
+    client.put("/users/me", json={"username": "bishop"})
+
+    assert client.get(f"/chats/{chat.id}/users").json()["users"][0]["username"] == "bishop"
+    assert client.get(f"/chats/{chat.id}").json()["chat"]["owner"]["username"] == "bishop"
+
+
+def test_cache_metrics_endpoint(client, chat):
+    client.get(f"/chats/{chat.id}")
+    client.get(f"/chats/{chat.id}")
+
+    stats = client.get("/metrics/cache").json()
+    assert set(stats) == {"user", "chat", "chat_members", "user_chats"}
+    assert stats["chat"]["hits"] >= 1
+
+
+def test_etag_and_body_agree_after_a_change_elsewhere(client, session, chat):
+    # Another worker renames the chat: this worker's cache is not invalidated, only the version moves
+    first = client.get(f"/chats/{chat.id}")
+    chat.name = "sulaco"
+    bump_version(session, "chat", chat.id)
+    session.commit()
+
+    second = client.get(f"/chats/{chat.id}", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.json()["chat"]["name"] == "sulaco"
+    assert client.get(f"/chats/{chat.id}", headers={"If-None-Match": second.headers["etag"]}).status_code == 304
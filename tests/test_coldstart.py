@@ -0,0 +1,45 @@
+import json
+import os
+import subprocess
+import sys
+
+from backend import coldstart, main
+from backend.main import lambda_handler
+
+event = {
+    "version": "2.0",
+    "routeKey": "$default",
+    "rawPath": "/chats",
+    "rawQueryString": "",
+    "headers": {"host": "test.local"},
+    "requestContext": {
+        "http": {"method": "GET", "path": "/chats", "sourceIp": "127.0.0.1", "protocol": "HTTP/1.1"},
+        "stage": "$default",
+    },
+    "isBase64Encoded": False,
+}
+
+
+def test_importing_the_app_does_not_load_crypto_libraries(tmp_path):
+    code = "import sys, backend.main; print(json.dumps(sorted(m for m in ('jose', 'passlib.context') if m in sys.modules)))"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'pony.db'}", "DB_ECHO": "false"}
+    output = subprocess.run([sys.executable, "-c", "import json; " + code], env=env, capture_output=True,
+                            text=True, check=True).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == []
+
+
+def test_lambda_handler_reports_cold_start_once(client, monkeypatch, caplog):
+    monkeypatch.setattr(coldstart, "phases", {"import": 0.5})
+    monkeypatch.setattr(coldstart, "_reported", False)
+    # The lifespan would otherwise create the default database file
+    monkeypatch.setattr(main, "migrate_database", lambda: None)
+
+    with caplog.at_level("INFO", logger="backend.coldstart"):
+        assert lambda_handler(event, None)["statusCode"] == 200
+        assert lambda_handler(event, None)["statusCode"] == 200
+
+    reports = [json.loads(record.getMessage()) for record in caplog.records if record.name == "backend.coldstart"]
+    assert len(reports) == 1
+    assert reports[0]["event"] == "cold_start"
+    assert {"import", "first_invocation", "total"} <= set(reports[0])
+    assert "cold_start_seconds{phase=\"first_invocation\"}" in client.get("/metrics").text
@@ -0,0 +1,58 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/chats/{id}", "/chats/{id}/messages", "/chats/{id}/users"])
+def test_chat_reads_revalidate_with_etag(client, chat, path):
+    url = path.format(id=chat.id)
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+
+
+def test_create_message_changes_chat_etag(client, chat, as_owner):
+    chat_id = chat.id
+    etag = client.get(f"/chats/{chat_id}/messages").headers["etag"]
+
+    client.post(f"/chats/{chat_id}/messages", json={"text": "hello"})
+
+    response = client.get(f"/chats/{chat_id}/messages", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["meta"]["count"] == 1
+
+
+def test_update_chat_changes_etag(client, chat):
+    etag = client.get(f"/chats/{chat.id}").headers["etag"]
+    client.put(f"/chats/{chat.id}", json={"name": "sulaco"})
+
+    response = client.get(f"/chats/{chat.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["chat"]["name"] == "sulaco"
+
+
+def test_update_current_user_changes_user_and_chat_etags(client, session, chat, as_owner):
+    user = as_owner
+    user_etag = client.get(f"/users/{user.id}").headers["etag"]
+    chat_etag = client.get(f"/chats/{chat.id}").headers["etag"]
+
+    assert client.put("/users/me", json={"username": "bishop"}).status_code == 200
+
+    assert client.get(f"/users/{user.id}", headers={"If-None-Match": user_etag}).status_code == 200
+    assert client.get(f"/chats/{chat.id}", headers={"If-None-Match": chat_etag}).status_code == 200
+
+
+def test_if_modified_since(client, chat):
+    last_modified = client.get(f"/chats/{chat.id}").headers["last-modified"]
+
+    assert client.get(f"/chats/{chat.id}", headers={"If-Modified-Since": last_modified}).status_code == 304
+    stale = "Mon, 01 Jan 2001 00:00:00 GMT"
+    assert client.get(f"/chats/{chat.id}", headers={"If-Modified-Since": stale}).status_code == 200
+
+
+def test_conditional_read_of_missing_chat_is_not_found(client):
+    response = client.get("/chats/999", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
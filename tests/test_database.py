@@ -0,0 +1,93 @@
+from sqlmodel import Session, SQLModel, select, text
+
+from backend import database as db
+from backend.schema import ChatInDB, ChatStatsInDB, EntityVersionInDB, MessageInDB, UserChatLinkInDB, UserInDB
+
+
+def test_make_engine_enables_wal_for_file_sqlite(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "sqlite_wal", True)
+    engine = db.make_engine(f"sqlite:///{tmp_path / 'pony.db'}")
+
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+    assert engine.pool.size() == db.pool_size
+
+
+def test_make_engine_supports_in_memory_sqlite():
+    engine = db.make_engine("sqlite://")
+    SQLModel.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        session.add(UserInDB(username="juniper", email="juniper@cat.com", hashed_password="x"))
+        session.commit()
+        assert session.exec(select(UserInDB)).one().username == "juniper"
+
+
+def _migrated_engine(tmp_path):
+    engine = db.make_engine(f"sqlite:///{tmp_path / 'pony.db'}")
+    db.migrate_database(engine)
+    return engine
+
+
+def test_schema_revision_matches_migration_head():
+    from alembic.script import ScriptDirectory
+
+    assert ScriptDirectory.from_config(db.alembic_config()).get_current_head() == db.schema_revision
+
+
+def test_migrations_match_the_models(tmp_path):
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    engine = _migrated_engine(tmp_path)
+    with engine.connect() as connection:
+        diffs = compare_metadata(MigrationContext.configure(connection), SQLModel.metadata)
+    # The FTS5 tables are managed by backend.search, not the models
+    diffs = [diff for diff in diffs if not (diff[0] == "remove_table" and diff[1].name.startswith("messages_fts"))]
+    assert diffs == []
+
+
+def test_migrate_database_skips_alembic_when_current(tmp_path, monkeypatch):
+    engine = _migrated_engine(tmp_path)
+    fresh_engine = db.make_engine(str(engine.url))
+    assert db.schema_is_current(fresh_engine)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("alembic should not run")
+
+    from alembic import command
+    monkeypatch.setattr(command, "upgrade", fail)
+    db.migrate_database(fresh_engine)
+
+
+def test_migrate_database_adopts_a_create_all_database(tmp_path):
+    engine = db.make_engine(f"sqlite:///{tmp_path / 'pony.db'}")
+    # The tables that existed before migrations did
+    legacy_tables = [model.__table__ for model in (UserInDB, ChatInDB, UserChatLinkInDB, MessageInDB, ChatStatsInDB,
+                                                   EntityVersionInDB)]
+    SQLModel.metadata.create_all(engine, tables=legacy_tables)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_messages_user_id"))
+        connection.execute(text("INSERT INTO users (username, email, hashed_password) VALUES ('a', 'a@b.c', 'x')"))
+
+    db.migrate_database(engine)
+
+    with engine.connect() as connection:
+        indexes = connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars().all()
+        assert connection.execute(text("SELECT count(*) FROM users")).scalar() == 1
+    assert "ix_messages_user_id" in indexes
+    assert db.schema_is_current(engine)
+
+
+def test_downgrade_to_base_drops_everything(tmp_path):
+    from alembic import command
+
+    engine = _migrated_engine(tmp_path)
+    with engine.begin() as connection:
+        config = db.alembic_config(engine)
+        config.attributes["connection"] = connection
+        command.downgrade(config, "base")
+
+    with engine.connect() as connection:
+        tables = connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars().all()
+    assert tables == ["alembic_version"]
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+from sqlmodel import Session, SQLModel, StaticPool, create_engine, select
+
+from backend import db_seeder, lookups
+from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB, UserInDB
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    local_engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    target_engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(local_engine)
+    with Session(local_engine) as session:
+        session.add(UserInDB(id=3, username="juniper", email="juniper@cat.com", hashed_password="x"))
+        session.add(ChatInDB(id=5, name="nostromo", owner_id=3))
+        session.add_all([MessageInDB(id=10 + i, text=f"message {i}", user_id=3, chat_id=5) for i in range(5)])
+        session.add(UserChatLinkInDB(user_id=3, chat_id=5))
+        session.commit()
+
+    monkeypatch.setattr(db_seeder, "local_engine", local_engine)
+    monkeypatch.setattr(db_seeder, "engine", target_engine)
+    monkeypatch.setattr(db_seeder, "batch_size", 2)
+    yield local_engine, target_engine
+    lookups.clear_caches()
+
+
+def test_seed_database_copies_rows_with_ids(engines):
+    _, target_engine = engines
+
+    result = db_seeder.seed_database()
+    assert result["complete"]
+    assert result["tables"]["messages"]["inserted"] == 5
+
+    with Session(target_engine) as session:
+        assert [m.id for m in session.exec(select(MessageInDB))] == [10, 11, 12, 13, 14]
+        assert session.get(ChatInDB, 5).owner.username == "juniper"
+
+    again = db_seeder.seed_database()
+    assert again["tables"]["messages"]["inserted"] == 0
+    assert again["tables"]["messages"]["final"] == 5
+
+
+def test_seed_database_clears_cached_memberships(engines):
+    local_engine, target_engine = engines
+    db_seeder.seed_database()
+    with Session(target_engine) as session:
+        assert lookups.get_chat_member_ids(session, 5) == [3]
+
+    with Session(local_engine) as session:
+        session.add(UserInDB(id=4, username="sarah", email="sarah@hotmail.com", hashed_password="x"))
+        session.add(UserChatLinkInDB(user_id=4, chat_id=5))
+        session.commit()
+    db_seeder.seed_database()
+
+    with Session(target_engine) as session:
+        assert lookups.get_chat_member_ids(session, 5) == [3, 4]
+
+
+def test_seed_database_resumes_from_checkpoint(engines):
+    _, target_engine = engines
+
+    result = db_seeder.seed_database(deadline=time.monotonic())
+    assert not result["complete"]
+    assert result["checkpoint"] == {"table": "users", "after": [3]}
+
+    checkpoint = result["checkpoint"]
+    for _ in range(10):
+        result = db_seeder.seed_database(checkpoint=checkpoint, deadline=time.monotonic())
+        if result["complete"]:
+            break
+        checkpoint = result["checkpoint"]
+
+    assert result["complete"]
+    with Session(target_engine) as session:
+        assert len(session.exec(select(MessageInDB)).all()) == 5
+        assert len(session.exec(select(UserChatLinkInDB)).all()) == 1
@@ -0,0 +1,87 @@
+import pytest
+from sqlmodel import select
+
+from backend.directory import prefix_match
+from backend.schema import UserInDB
+
+names = ["ash", "bishop", "dallas", "juniper", "kane", "lambert", "parker", "ripley", "ripley2", "sarah"]
+
+
+@pytest.fixture
+def users(session):
+    users = [UserInDB(username=name, email=f"{name.title()}@nostromo.com", hashed_password="x") for name in names]
+    users.append(UserInDB(username="mother", email="jones@nostromo.com", hashed_password="x"))
+    session.add_all(users)
+    session.commit()
+    return users
+
+
+def test_users_are_paginated_by_username(client, users):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 4, **({"after": cursor} if cursor else {})}
+        body = client.get("/users", params=params).json()
+        seen += [user["username"] for user in body["users"]]
+        cursor = body["meta"]["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == sorted(names + ["mother"])
+    assert "hashed_password" not in body["users"][0]
+
+
+def test_users_prefix_search_matches_username_or_email(client, users):
+    body = client.get("/users", params={"q": "rip"}).json()
+    assert [user["username"] for user in body["users"]] == ["ripley", "ripley2"]
+
+    # Email prefixes match in any case
+    body = client.get("/users", params={"q": "jo"}).json()
+    assert [user["username"] for user in body["users"]] == ["mother"]
+
+    assert client.get("/users", params={"q": "zz"}).json() == {"meta": {"count": 0, "next_cursor": None}, "users": []}
+
+
+def test_users_prefix_search_pages(client, users):
+    first = client.get("/users", params={"q": "r", "limit": 1}).json()
+    second = client.get("/users", params={"q": "r", "limit": 1, "after": first["meta"]["next_cursor"]}).json()
+
+    assert [user["username"] for user in first["users"] + second["users"]] == ["ripley", "ripley2"]
+    assert second["meta"]["next_cursor"] is None
+
+
+def test_users_rejects_bad_cursors(client, users):
+    for cursor in ("_w", "!!!", "cmlw!bGV5"):
+        response = client.get("/users", params={"after": cursor})
+        assert response.status_code == 422
+        assert response.json()["detail"]["type"] == "invalid_cursor"
+
+
+def test_typeahead_prefers_username_matches(client, users):
+    response = client.get("/users/typeahead", params={"q": "j"})
+
+    assert response.status_code == 200
+    assert response.json() == {"users": [
+        {"id": users[3].id, "username": "juniper"},
+        {"id": users[-1].id, "username": "mother"},
+    ]}
+
+
+def test_typeahead_is_capped(client, users):
+    assert len(client.get("/users/typeahead", params={"q": "r", "limit": 1}).json()["users"]) == 1
+    assert client.get("/users/typeahead", params={"q": "r", "limit": 100}).status_code == 422
+    assert client.get("/users/typeahead").status_code == 422
+
+
+def test_prefix_match_bounds_the_range(session, users):
+    found = session.exec(select(UserInDB.username).where(prefix_match(UserInDB.username, "ripley"))).all()
+    assert sorted(found) == ["ripley", "ripley2"]
+
+
+def test_prefix_search_at_the_edges_of_unicode(client, session, users):
+    # The successor of U+D7FF is a surrogate, and U+10FFFF has none
+    session.add(UserInDB(username="\ud7ff", email="edge@nostromo.com", hashed_password="x"))
+    session.commit()
+
+    body = client.get("/users", params={"q": "\ud7ff"}).json()
+    assert [user["username"] for user in body["users"]] == ["\ud7ff"]
+    assert client.get("/users", params={"q": "\U0010ffff"}).json()["users"] == []
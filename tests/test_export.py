@@ -0,0 +1,89 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from backend import export
+from backend.export import export_messages
+from backend.schema import MessageInDB
+
+start = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def chat(chat, session):
+    session.exec(insert(MessageInDB), params=[
+        {"text": f"message {n}", "user_id": chat.owner_id, "chat_id": chat.id, "created_at": start + timedelta(minutes=n)}
+        for n in range(250)
+    ])
+    session.commit()
+    return chat
+
+
+def test_export_ndjson_streams_every_message_in_order(client, chat):
+    response = client.get(f"/chats/{chat.id}/export")
+
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert 'filename="chat-1-messages.ndjson"' in response.headers["content-disposition"]
+    messages = [json.loads(line) for line in response.text.splitlines()]
+    assert [message["text"] for message in messages] == [f"message {n}" for n in range(250)]
+    assert messages[0]["user"]["username"] == "juniper"
+    assert messages[0]["created_at"] == "2024-01-01T00:00:00"
+
+
+def test_export_csv_quotes_awkward_text(client, session, chat):
+    session.add(MessageInDB(text='a "quoted", multi-line\ntext', user_id=1, chat_id=chat.id,
+                            created_at=start + timedelta(days=1)))
+    session.commit()
+
+    response = client.get(f"/chats/{chat.id}/export", params={"format": "csv"})
+
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 251
+    assert rows[0] == {"id": "1", "chat_id": "1", "created_at": "2024-01-01T00:00:00", "user_id": "1",
+                       "username": "juniper", "text": "message 0"}
+    assert rows[-1]["text"] == 'a "quoted", multi-line\ntext'
+
+
+def test_export_filters_by_time_range(client, chat):
+    response = client.get(f"/chats/{chat.id}/export", params={
+        "since": (start + timedelta(minutes=10)).isoformat(),
+        "until": (start + timedelta(minutes=20)).isoformat(),
+    })
+
+    texts = [json.loads(line)["text"] for line in response.text.splitlines()]
+    assert texts == [f"message {n}" for n in range(10, 20)]
+
+
+def test_export_gzip(client, chat):
+    response = client.get(f"/chats/{chat.id}/export", params={"format": "csv", "gzip": True})
+
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="chat-1-messages.csv.gz"' in response.headers["content-disposition"]
+    lines = gzip.decompress(response.content).decode().splitlines()
+    assert lines[0] == "id,chat_id,created_at,user_id,username,text"
+    assert len(lines) == 251
+
+
+def test_export_reads_in_batches(session, chat, monkeypatch):
+    monkeypatch.setattr(export, "export_batch_size", 100)
+
+    chunks = list(export_messages(session.get_bind(), chat.id))
+
+    assert [chunk.count(b"\n") for chunk in chunks] == [100, 100, 50]
+
+
+def test_export_missing_chat(client):
+    response = client.get("/chats/999/export")
+    assert response.status_code == 404
+
+
+def test_export_rejects_unknown_formats(client, chat):
+    response = client.get(f"/chats/{chat.id}/export", params={"format": "xml"})
+    assert response.status_code == 422
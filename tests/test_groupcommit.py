@@ -0,0 +1,112 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, func, select
+
+from backend import database as db
+from backend import groupcommit, lookups, ratelimit
+from backend.auth import get_current_user_id
+from backend.groupcommit import GroupCommitWriter
+from backend.main import app
+from backend.schema import ChatInDB, ChatStatsInDB, InboxEntryInDB, MessageInDB, UserInDB
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # A file database, so the writer thread and the requests use separate connections
+    engine = db.make_engine(f"sqlite:///{tmp_path / 'messages.db'}")
+    db.migrate_database(engine)
+    yield engine
+    groupcommit.close_writers()
+    engine.dispose()
+
+
+@pytest.fixture
+def chat_id(engine):
+    with Session(engine) as session:
+        owner = UserInDB(username="juniper", email="juniper@cat.com", hashed_password="x")
+        chat = ChatInDB(name="nostromo", owner=owner, users=[owner])
+        session.add(chat)
+        session.commit()
+        return chat.id
+
+
+def _count_messages(engine, chat_id):
+    with Session(engine) as session:
+        return session.exec(select(func.count(MessageInDB.id)).where(MessageInDB.chat_id == chat_id)).one()
+
+
+def test_writer_commits_queued_messages_together(engine, chat_id):
+    writer = GroupCommitWriter(engine, interval=0.2)
+    created_at = datetime.utcnow()
+    futures = [writer.submit(chat_id, 1, f"message {i}", created_at) for i in range(10)]
+    ids = [future.result(timeout=5) for future in futures]
+    writer.close()
+
+    assert ids == sorted(ids) and len(set(ids)) == 10
+    assert _count_messages(engine, chat_id) == 10
+    with Session(engine) as session:
+        assert session.get(ChatStatsInDB, chat_id).message_count == 10
+        assert session.get(MessageInDB, ids[3]).text == "message 3"
+        assert session.get(InboxEntryInDB, (1, chat_id)).last_message_id == ids[-1]
+
+
+def test_failed_message_does_not_fail_its_batch(engine, chat_id):
+    writer = GroupCommitWriter(engine, interval=0.2)
+    created_at = datetime.utcnow()
+    good = writer.submit(chat_id, 1, "hello", created_at)
+    bad = writer.submit(chat_id, 1, None, created_at)
+    also_good = writer.submit(chat_id, 1, "world", created_at)
+
+    assert good.result(timeout=5) < also_good.result(timeout=5)
+    with pytest.raises(IntegrityError):
+        bad.result(timeout=5)
+    writer.close()
+    assert _count_messages(engine, chat_id) == 2
+
+
+def test_concurrent_posts_go_through_the_writer(engine, chat_id, monkeypatch):
+    def _get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    monkeypatch.setattr(groupcommit, "group_commit", True)
+    monkeypatch.setattr(ratelimit, "rate_limiting", False)
+    app.dependency_overrides[db.get_session] = _get_session_override
+    app.dependency_overrides[get_current_user_id] = lambda: 1
+    lookups.clear_caches()
+    try:
+        client = TestClient(app)
+        # Import anyio's backend on one thread first; concurrent first imports race
+        assert client.get(f"/chats/{chat_id}").status_code == 200
+        with ThreadPoolExecutor(8) as pool:
+            responses = list(pool.map(
+                lambda i: client.post(f"/chats/{chat_id}/messages", json={"text": f"message {i}"}), range(24)
+            ))
+    finally:
+        app.dependency_overrides.clear()
+        lookups.clear_caches()
+
+    assert all(response.status_code == 201 for response in responses)
+    messages = [response.json()["message"] for response in responses]
+    assert len({message["id"] for message in messages}) == 24
+    assert all(message["user"]["username"] == "juniper" for message in messages)
+    assert _count_messages(engine, chat_id) == 24
+
+
+def test_post_that_outlives_the_timeout_is_a_503(client, chat, as_owner, monkeypatch):
+    class StalledWriter:
+        def submit(self, *args):
+            return Future()
+
+    monkeypatch.setattr(groupcommit, "group_commit", True)
+    monkeypatch.setattr(groupcommit, "submit_timeout", 0.01)
+    monkeypatch.setattr(groupcommit, "get_writer", lambda engine: StalledWriter())
+
+    response = client.post(f"/chats/{chat.id}/messages", json={"text": "hello"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.json()["detail"]["type"] == "commit_pending"
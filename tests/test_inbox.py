@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+
+from backend.auth import get_current_user, get_current_user_id
+from backend.inbox import preview_length, rebuild_inbox
+from backend.main import app
+from backend.schema import ChatInDB, MessageInDB
+
+
+@pytest.fixture
+def chats(session, users):
+    juniper, sarah, ripley = users
+    chats = [
+        ChatInDB(name="nostromo", owner=juniper, users=[juniper, sarah], created_at=datetime(2024, 1, 1)),
+        ChatInDB(name="sulaco", owner=sarah, users=[juniper, sarah, ripley], created_at=datetime(2024, 1, 2)),
+        ChatInDB(name="narcissus", owner=ripley, users=[juniper, ripley], created_at=datetime(2024, 1, 3)),
+    ]
+    session.add_all(chats)
+    session.commit()
+    rebuild_inbox(session)
+    return chats
+
+
+def _inbox(client, user, **params):
+    app.dependency_overrides[get_current_user_id] = lambda: user.id
+    response = client.get("/users/me/inbox", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_inbox_lists_chats_by_last_activity(client, users, chats, post_message):
+    juniper, sarah, ripley = users
+    nostromo, sulaco, narcissus = chats
+
+    inbox = _inbox(client, juniper)
+    assert [entry["chat_name"] for entry in inbox["entries"]] == ["narcissus", "sulaco", "nostromo"]
+    assert all(entry["last_message"] is None and entry["unread_count"] == 0 for entry in inbox["entries"])
+
+    post_message(sarah, nostromo, "hello")
+    post_message(sarah, nostromo, "anyone there?")
+    message = post_message(ripley, sulaco, "hi all")
+
+    inbox = _inbox(client, juniper)
+    assert [entry["chat_name"] for entry in inbox["entries"]] == ["sulaco", "nostromo", "narcissus"]
+    sulaco_entry, nostromo_entry, _ = inbox["entries"]
+    assert sulaco_entry["last_message"]["id"] == message["id"]
+    assert sulaco_entry["last_message"]["text"] == "hi all"
+    assert sulaco_entry["last_message"]["user"]["username"] == "ripley"
+    assert sulaco_entry["unread_count"] == 1
+    assert nostromo_entry["last_message"]["text"] == "anyone there?"
+    assert nostromo_entry["unread_count"] == 2
+
+
+def test_posting_clears_the_authors_unread_count(client, users, chats, post_message):
+    juniper, sarah, _ = users
+    nostromo = chats[0]
+
+    post_message(sarah, nostromo, "hello")
+    post_message(juniper, nostromo, "hi")
+
+    assert _inbox(client, juniper)["entries"][0]["unread_count"] == 0
+    assert _inbox(client, sarah)["entries"][0]["unread_count"] == 1
+
+
+def test_inbox_is_paginated(client, users, chats):
+    juniper = users[0]
+
+    first = _inbox(client, juniper, limit=2)
+    assert first["meta"]["count"] == 2
+    second = _inbox(client, juniper, limit=2, before=first["meta"]["next_cursor"])
+
+    assert [entry["chat_name"] for entry in first["entries"] + second["entries"]] == \
+        ["narcissus", "sulaco", "nostromo"]
+    assert second["meta"]["next_cursor"] is None
+
+
+def test_batch_and_long_messages_update_the_inbox(client, users, chats):
+    juniper, sarah, _ = users
+    nostromo = chats[0]
+    app.dependency_overrides[get_current_user] = lambda: sarah
+    response = client.post(f"/chats/{nostromo.id}/messages:batch", json=[{"text": "one"}, {"text": "x" * 500}])
+    assert response.status_code == 201, response.text
+
+    entry = _inbox(client, juniper)["entries"][0]
+    assert entry["chat_name"] == "nostromo"
+    assert entry["unread_count"] == 2
+    assert entry["last_message"]["text"] == "x" * preview_length
+
+
+def test_rebuild_inbox_picks_up_messages_added_directly(client, session, users, chats):
+    juniper, sarah, _ = users
+    nostromo = chats[0]
+    session.add(MessageInDB(text="imported", user_id=sarah.id, chat_id=nostromo.id, created_at=datetime(2024, 2, 1)))
+    session.commit()
+    rebuild_inbox(session)
+
+    entry = _inbox(client, juniper)["entries"][0]
+    assert entry["chat_name"] == "nostromo"
+    assert entry["last_message"]["text"] == "imported"
+
+
+def test_inbox_requires_authentication(client):
+    assert client.get("/users/me/inbox").status_code == 401
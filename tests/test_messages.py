@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+from backend.auth import get_current_user_id
+from backend.main import app
+from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB, UserInDB
+from backend.stats import _backfill_chat_stats, get_chat_stats, record_message
+
+
+def _seed_chat(session, message_count):
+    user = UserInDB(username="juniper", email="juniper@cat.com", hashed_password="x")
+    chat = ChatInDB(name="nostromo", owner=user)
+    session.add(chat)
+    session.commit()
+    start = datetime(2024, 1, 1)
+    for i in range(message_count):
+        session.add(MessageInDB(text=f"message {i}", user_id=user.id, chat_id=chat.id,
+                                created_at=start + timedelta(minutes=i)))
+    session.commit()
+    return chat
+
+
+def test_get_chat_messages_newest_page(client, session):
+    chat = _seed_chat(session, 5)
+
+    response = client.get(f"/chats/{chat.id}/messages", params={"limit": 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert [m["text"] for m in body["messages"]] == ["message 3", "message 4"]
+    assert body["meta"]["count"] == 2
+    assert body["meta"]["next_cursor"] is not None
+
+
+def test_get_chat_messages_pages_back_and_forward(client, session):
+    chat = _seed_chat(session, 5)
+
+    first = client.get(f"/chats/{chat.id}/messages", params={"limit": 2}).json()
+    second = client.get(f"/chats/{chat.id}/messages",
+                        params={"limit": 2, "before": first["meta"]["next_cursor"]}).json()
+    assert [m["text"] for m in second["messages"]] == ["message 1", "message 2"]
+
+    last = client.get(f"/chats/{chat.id}/messages",
+                      params={"limit": 2, "before": second["meta"]["next_cursor"]}).json()
+    assert [m["text"] for m in last["messages"]] == ["message 0"]
+    assert last["meta"]["next_cursor"] is None
+
+    newer = client.get(f"/chats/{chat.id}/messages",
+                       params={"limit": 2, "after": second["meta"]["prev_cursor"]}).json()
+    assert [m["text"] for m in newer["messages"]] == ["message 3", "message 4"]
+
+
+def test_get_chat_messages_invalid_cursor(client, session):
+    chat = _seed_chat(session, 1)
+
+    response = client.get(f"/chats/{chat.id}/messages", params={"before": "not-a-cursor"})
+    assert response.status_code == 422
+    assert response.json()["detail"]["type"] == "invalid_cursor"
+
+
+def test_get_chat_meta_counts(client, session):
+    chat = _seed_chat(session, 3)
+    session.add(UserChatLinkInDB(user_id=chat.owner_id, chat_id=chat.id))
+    session.commit()
+
+    response = client.get(f"/chats/{chat.id}")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["meta"]["message_count"] == 3
+    assert body["meta"]["user_count"] == 1
+    assert body["meta"]["last_message_at"] == "2024-01-01T00:02:00"
+    assert "messages" not in body and "users" not in body
+
+
+def test_create_message_updates_chat_meta(client, session):
+    chat = _seed_chat(session, 2)
+    chat_id, owner_id = chat.id, chat.owner_id
+    client.get(f"/chats/{chat_id}")
+
+    app.dependency_overrides[get_current_user_id] = lambda: owner_id
+    response = client.post(f"/chats/{chat_id}/messages", json={"text": "hello"})
+    assert response.status_code == 201
+
+    body = client.get(f"/chats/{chat_id}", params={"include": ["messages", "users"]}).json()
+    assert body["meta"]["message_count"] == 3
+    assert body["meta"]["last_message_at"] == response.json()["message"]["created_at"]
+    assert len(body["messages"]) == 3
+    assert body["users"] == []
+
+
+def test_create_message_rejects_token_of_deleted_user(client, session):
+    chat = _seed_chat(session, 0)
+    app.dependency_overrides[get_current_user_id] = lambda: 42
+
+    response = client.post(f"/chats/{chat.id}/messages", json={"text": "ghost"})
+    assert response.status_code == 401
+    assert session.exec(select(MessageInDB)).all() == []
+
+
+def test_concurrent_chat_stats_backfill(session):
+    chat = _seed_chat(session, 2)
+    with Session(session.get_bind()) as first, Session(session.get_bind()) as second:
+        # Both requests found no stats row; the second backfills after the first has committed
+        get_chat_stats(first, chat.id)
+        stats = _backfill_chat_stats(second, chat.id)
+        assert stats.message_count == 2
+        record_message(second, chat.id, datetime(2024, 2, 1))
+        second.commit()
+
+    session.expire_all()
+    assert get_chat_stats(session, chat.id).message_count == 3
@@ -0,0 +1,59 @@
+from backend.auth import get_password_hash
+from backend.metrics import Histogram, password_hash_duration, request_db_queries, requests_total
+
+
+def test_requests_are_counted_by_route_template(client, chat):
+    labels = {"method": "GET", "route": "/chats/{chat_id}", "status": 200}
+    before = requests_total.value(**labels)
+
+    client.get(f"/chats/{chat.id}")
+    client.get(f"/chats/{chat.id}")
+
+    assert requests_total.value(**labels) == before + 2
+
+
+def test_unmatched_paths_share_one_label(client):
+    before = requests_total.value(method="GET", route="unmatched", status=404)
+    client.get("/no/such/path")
+    assert requests_total.value(method="GET", route="unmatched", status=404) == before + 1
+
+
+def test_db_queries_are_recorded_per_request(client, chat):
+    labels = {"method": "GET", "route": "/chats/{chat_id}/messages"}
+    before = request_db_queries.count(**labels)
+    client.get(f"/chats/{chat.id}/messages")
+    assert request_db_queries.count(**labels) == before + 1
+
+
+def test_password_hashing_is_timed():
+    before = password_hash_duration.count(operation="hash")
+    get_password_hash("hunter2")
+    assert password_hash_duration.count(operation="hash") == before + 1
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", ("route",), buckets=(0.1, 1))
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+    histogram.observe(5, route="/a")
+
+    assert histogram.render().splitlines()[2:] == [
+        'test_seconds_bucket{route="/a",le="0.1"} 1',
+        'test_seconds_bucket{route="/a",le="1"} 2',
+        'test_seconds_bucket{route="/a",le="+Inf"} 3',
+        'test_seconds_sum{route="/a"} 5.55',
+        'test_seconds_count{route="/a"} 3',
+    ]
+
+
+def test_metrics_endpoint_exposes_prometheus_text(client, chat):
+    client.get(f"/chats/{chat.id}")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'http_requests_total{method="GET",route="/chats/{chat_id}",status="200"}' in body
+    assert "http_requests_in_flight" in body
+    assert 'cache_hits_total{cache="chat"}' in body
@@ -0,0 +1,39 @@
+import json
+import logging
+import re
+
+import pytest
+
+from backend import profiling
+
+
+@pytest.fixture
+def sql_profiling(monkeypatch):
+    monkeypatch.setattr(profiling, "sql_profiling", True)
+
+
+def test_server_timing_is_off_by_default(client, chat):
+    assert "server-timing" not in client.get(f"/chats/{chat.id}").headers
+
+
+def test_server_timing_lists_each_query(client, chat, sql_profiling):
+    response = client.get(f"/chats/{chat.id}", params={"include": ["messages", "users"]})
+
+    header = response.headers["server-timing"]
+    assert header.startswith("db;dur=")
+    query_count = int(re.search(r'desc="(\d+) queries"', header).group(1))
+    statements = re.findall(r'q\d+;dur=[\d.]+;desc="([^"]*)"', header)
+    assert len(statements) == query_count > 1
+    assert any(statement.startswith("SELECT") for statement in statements)
+
+
+def test_slow_queries_are_logged(client, chat, sql_profiling, monkeypatch, caplog):
+    monkeypatch.setattr(profiling, "slow_query_threshold", 0)
+    with caplog.at_level(logging.WARNING, logger="backend.sql"):
+        client.get(f"/chats/{chat.id}/messages")
+
+    records = [json.loads(record.getMessage()) for record in caplog.records if record.name == "backend.sql"]
+    assert records
+    assert records[0]["event"] == "slow_query"
+    assert records[0]["path"] == f"/chats/{chat.id}/messages"
+    assert records[0]["statement"].startswith(("SELECT", "INSERT"))
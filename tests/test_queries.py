@@ -0,0 +1,67 @@
+import pytest
+
+from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB, UserInDB
+
+
+@pytest.fixture
+def add_chat(session):
+    """Adds a chat with a new owner; the owner also joins and posts in chat 1, and user 1 joins the chat."""
+    created = []
+
+    def add():
+        n = len(created)
+        owner = UserInDB(username=f"owner{n}", email=f"owner{n}@cat.com", hashed_password="x")
+        chat = ChatInDB(name=f"chat{n}", owner=owner)
+        session.add(chat)
+        session.flush()
+        session.add_all([
+            UserChatLinkInDB(user_id=owner.id, chat_id=chat.id),
+            MessageInDB(text=f"hello from {n}", user_id=owner.id, chat_id=1),
+        ])
+        if chat.id != 1:
+            session.add_all([
+                UserChatLinkInDB(user_id=owner.id, chat_id=1),
+                UserChatLinkInDB(user_id=1, chat_id=chat.id),
+            ])
+        session.commit()
+        created.append(chat.id)
+
+    add()
+    return add
+
+
+def _grow(add_chat, n=3):
+    def grow():
+        for _ in range(n):
+            add_chat()
+    return grow
+
+
+def test_get_users_query_count(assert_constant_queries, add_chat):
+    small, large = assert_constant_queries("/users", _grow(add_chat))
+    assert large["meta"]["count"] > small["meta"]["count"]
+
+
+def test_get_chats_query_count(assert_constant_queries, add_chat):
+    small, large = assert_constant_queries("/chats", _grow(add_chat))
+    assert large["meta"]["count"] > small["meta"]["count"]
+
+
+def test_get_user_chats_query_count(assert_constant_queries, add_chat):
+    small, large = assert_constant_queries("/users/1/chats", _grow(add_chat))
+    assert large["meta"]["count"] > small["meta"]["count"]
+
+
+def test_get_chat_users_query_count(assert_constant_queries, add_chat):
+    small, large = assert_constant_queries("/chats/1/users", _grow(add_chat))
+    assert large["meta"]["count"] > small["meta"]["count"]
+
+
+def test_get_chat_messages_query_count(assert_constant_queries, add_chat):
+    small, large = assert_constant_queries("/chats/1/messages", _grow(add_chat))
+    assert large["meta"]["count"] > small["meta"]["count"]
+
+
+def test_search_messages_query_count(assert_constant_queries, add_chat):
+    small, large = assert_constant_queries("/search/messages", _grow(add_chat), q="hello")
+    assert large["meta"]["count"] > small["meta"]["count"]
@@ -0,0 +1,110 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+
+from backend import database as db, lookups
+from backend.auth import get_current_user, get_current_user_id
+from backend.inbox import rebuild_inbox
+from backend.main import app
+from backend.pagination import encode_cursor, encode_key_cursor
+from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB, UserInDB
+
+# Reads and writes on the per-user and per-chat routes; none of them should need a full scan
+routes = [
+    ("GET", "/users", {"q": "user"}),
+    ("GET", "/users", {"after": "user cursor"}),
+    ("GET", "/users/typeahead", {"q": "User"}),
+    ("GET", "/users/1", {}),
+    ("GET", "/users/1/chats", {}),
+    ("GET", "/users/me", {}),
+    ("GET", "/users/me/sync", {}),
+    ("GET", "/users/me/sync", {"since": "cursor"}),
+    ("GET", "/users/me/inbox", {}),
+    ("GET", "/users/me/inbox", {"before": "inbox cursor"}),
+    ("GET", "/users/me/unread", {}),
+    ("GET", "/chats/1", {"include": ["messages", "users"]}),
+    ("GET", "/chats/1/messages", {}),
+    ("GET", "/chats/1/messages", {"before": "cursor"}),
+    ("GET", "/chats/1/users", {}),
+    ("GET", "/chats/1/receipts", {}),
+    ("GET", "/chats/1/export", {}),
+    ("GET", "/chats/1/export", {"since": "2024-01-01T00:00:00", "format": "csv"}),
+    ("GET", "/search/messages", {"q": "hello", "chat_id": 1}),
+    ("PUT", "/chats/1", {"json": {"name": "renamed"}}),
+    ("POST", "/chats/1/messages", {"json": {"text": "hello again"}}),
+    ("POST", "/chats/1/read", {}),
+]
+
+# A full pass over a table, or over every entry of one of its indexes
+full_scan = re.compile(r"^SCAN \w+( USING (COVERING )?INDEX \w+)?$")
+
+
+@pytest.fixture
+def migrated_session(tmp_path):
+    engine = db.make_engine(f"sqlite:///{tmp_path / 'pony.db'}")
+    db.migrate_database(engine)
+    with Session(engine) as session:
+        users = [UserInDB(username=f"user{n}", email=f"user{n}@example.com", hashed_password="x") for n in range(5)]
+        chats = [ChatInDB(name=f"chat {n}", owner=users[n]) for n in range(3)]
+        session.add_all(users + chats)
+        session.commit()
+        session.add_all([UserChatLinkInDB(user_id=user.id, chat_id=chat.id) for chat in chats for user in users[:3]])
+        session.add_all([MessageInDB(text=f"hello {n}", user_id=users[n % 3].id, chat_id=chats[n % 3].id)
+                         for n in range(30)])
+        session.commit()
+        rebuild_inbox(session)
+        yield session
+
+
+def _query_plan(connection, statement, parameters):
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [row[-1] for row in rows]
+
+
+@pytest.mark.parametrize("method, url, options", routes, ids=[f"{method} {url}" for method, url, _ in routes])
+def test_route_queries_use_indexes(migrated_session, method, url, options):
+    session = migrated_session
+    user = session.get(UserInDB, 1)
+    app.dependency_overrides[db.get_session] = lambda: session
+    app.dependency_overrides[get_current_user_id] = lambda: 1
+    app.dependency_overrides[get_current_user] = lambda: user
+    if options.get("before") == "cursor":
+        message = session.get(MessageInDB, 10)
+        options = {"before": encode_cursor(message.created_at, message.id)}
+    elif options.get("since") == "cursor":
+        options = {"since": encode_cursor(datetime.utcnow() - timedelta(hours=1), 10)}
+    elif options.get("after") == "user cursor":
+        options = {"after": encode_key_cursor("user1")}
+    elif options.get("before") == "inbox cursor":
+        options = {"before": encode_cursor(datetime.utcnow(), 3)}
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE")):
+            statements.append((statement, parameters))
+
+    engine = session.get_bind()
+    client = TestClient(app)
+    params = {key: value for key, value in options.items() if key != "json"}
+    # The first request lazily creates ETag version rows; plan the steady state with cold caches
+    client.request(method, url, params=params, json=options.get("json"))
+    lookups.clear_caches()
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        response = client.request(method, url, params=params, json=options.get("json"))
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+        app.dependency_overrides.clear()
+    assert response.status_code < 400, response.text
+    assert statements
+
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = _query_plan(connection, statement, parameters)
+            scans = [step for step in plan if full_scan.match(step)]
+            assert not scans, f"{method} {url} scans a table:\n{statement}\n{plan}"
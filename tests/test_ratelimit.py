@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from backend import ratelimit
+from backend.auth import get_current_user_id
+from backend.main import app
+from backend.ratelimit import Budget, ConcurrencyLimiter, MemoryRateLimitBackend
+from backend.schema import UserInDB
+
+
+@pytest.fixture
+def chat(chat, session):
+    chat.users.append(UserInDB(username="sarah", email="sarah@hotmail.com", hashed_password="x"))
+    session.commit()
+    return chat
+
+
+def test_token_bucket_allows_burst_then_refills(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: clock[0])
+    backend = MemoryRateLimitBackend()
+    budget = Budget(rate=1, burst=2)
+
+    assert backend.take("k", budget) == 0
+    assert backend.take("k", budget) == 0
+    assert backend.take("k", budget) == pytest.approx(1)
+
+    clock[0] += 1
+    assert backend.take("k", budget) == 0
+    assert backend.take("other", budget) == 0
+
+
+def test_login_is_rate_limited_per_client(client, monkeypatch):
+    monkeypatch.setitem(ratelimit.budgets, "login", Budget(rate=0.1, burst=2))
+    credentials = {"username": "nobody", "password": "wrong"}
+
+    assert client.post("/auth/token", data=credentials).status_code == 401
+    assert client.post("/auth/token", data=credentials).status_code == 401
+    response = client.post("/auth/token", data=credentials)
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "10"
+    assert response.json()["detail"]["type"] == "rate_limited"
+
+
+def test_messages_are_rate_limited_per_user(client, chat, monkeypatch):
+    monkeypatch.setitem(ratelimit.budgets, "messages", Budget(rate=0.5, burst=1))
+    first, second = chat.users
+    current_user = [first.id]
+    app.dependency_overrides[get_current_user_id] = lambda: current_user[0]
+
+    assert client.post(f"/chats/{chat.id}/messages", json={"text": "one"}).status_code == 201
+    assert client.post(f"/chats/{chat.id}/messages", json={"text": "two"}).status_code == 429
+
+    current_user[0] = second.id
+    assert client.post(f"/chats/{chat.id}/messages", json={"text": "three"}).status_code == 201
+
+
+def test_message_batches_are_charged_per_message(client, chat, as_owner, monkeypatch):
+    monkeypatch.setitem(ratelimit.budgets, "bulk_messages", Budget(rate=0.5, burst=5))
+    url = f"/chats/{chat.id}/messages:batch"
+
+    assert client.post(url, json=[{"text": str(i)} for i in range(3)]).status_code == 201
+    response = client.post(url, json=[{"text": str(i)} for i in range(3)])
+
+    assert response.status_code == 429
+    assert response.json()["detail"]["budget"] == "bulk_messages"
+    assert client.post(url, json=[{"text": "last"}, {"text": "one"}]).status_code == 201
+
+
+def test_rate_limiting_can_be_disabled(client, monkeypatch):
+    monkeypatch.setitem(ratelimit.budgets, "login", Budget(rate=0.1, burst=1))
+    monkeypatch.setattr(ratelimit, "rate_limiting", False)
+    for _ in range(3):
+        assert client.post("/auth/token", data={"username": "nobody", "password": "x"}).status_code == 401
+
+
+def test_concurrency_limiter_queues_then_sheds():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, max_queue=1, queue_timeout=1)
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 1
+
+        with pytest.raises(HTTPException) as shed:
+            await limiter.acquire()
+        assert shed.value.status_code == 503
+        assert shed.value.headers["Retry-After"] == "1"
+
+        limiter.release()
+        await queued
+        assert limiter.active == 1 and limiter.queue_depth == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_concurrency_limiter_sheds_after_queue_timeout():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test", limit=1, max_queue=5, queue_timeout=0.01)
+        await limiter.acquire()
+        with pytest.raises(HTTPException) as shed:
+            await limiter.acquire()
+        assert shed.value.status_code == 503
+        assert limiter.queue_depth == 0
+
+    asyncio.run(scenario())
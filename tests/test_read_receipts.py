@@ -0,0 +1,138 @@
+import pytest
+
+from backend.auth import get_current_user_id
+from backend.inbox import rebuild_inbox
+from backend.main import app
+from backend.schema import ChatInDB, InboxEntryInDB
+
+
+@pytest.fixture
+def chat(session, users):
+    juniper, sarah, _ = users
+    chat = ChatInDB(name="nostromo", owner=juniper, users=[juniper, sarah])
+    session.add(chat)
+    session.commit()
+    rebuild_inbox(session)
+    return chat
+
+
+def _as(user):
+    user_id = user.id
+    app.dependency_overrides[get_current_user_id] = lambda: user_id
+
+
+def test_marking_read_clears_the_unread_count(client, users, chat, post_message):
+    juniper, sarah, _ = users
+    post_message(sarah, chat, "hello")
+    newest = post_message(sarah, chat, "anyone there?")["id"]
+
+    _as(juniper)
+    assert client.get("/users/me/unread").json() == {
+        "meta": {"count": 1, "total": 2},
+        "chats": [{"chat_id": chat.id, "last_read_message_id": None, "unread_count": 2}],
+    }
+
+    response = client.post(f"/chats/{chat.id}/read")
+    assert response.status_code == 200, response.text
+    assert response.json()["read_state"] == {"chat_id": chat.id, "last_read_message_id": newest, "unread_count": 0}
+    assert client.get("/users/me/unread").json() == {"meta": {"count": 0, "total": 0}, "chats": []}
+    assert client.get("/users/me/inbox").json()["entries"][0]["last_read_message_id"] == newest
+
+
+def test_reading_up_to_a_message_counts_only_later_messages_by_others(client, users, chat, post_message):
+    juniper, sarah, _ = users
+    first = post_message(sarah, chat, "one")["id"]
+    second = post_message(sarah, chat, "two")["id"]
+    post_message(sarah, chat, "three")
+
+    _as(juniper)
+    response = client.post(f"/chats/{chat.id}/read", json={"message_id": second})
+    assert response.json()["read_state"]["unread_count"] == 1
+
+    # The watermark never moves backwards
+    response = client.post(f"/chats/{chat.id}/read", json={"message_id": first})
+    assert response.json()["read_state"] == {"chat_id": chat.id, "last_read_message_id": second, "unread_count": 1}
+
+
+def test_new_messages_count_against_the_watermark(client, users, chat, post_message):
+    juniper, sarah, _ = users
+    post_message(sarah, chat, "one")
+    _as(juniper)
+    client.post(f"/chats/{chat.id}/read")
+    post_message(sarah, chat, "two")
+
+    _as(juniper)
+    assert client.get("/users/me/unread").json()["meta"]["total"] == 1
+
+
+def test_receipts_show_each_members_watermark(client, users, chat, post_message):
+    juniper, sarah, _ = users
+    first = post_message(juniper, chat, "one")["id"]
+    second = post_message(sarah, chat, "two")["id"]
+
+    receipts = client.get(f"/chats/{chat.id}/receipts").json()
+    assert receipts["receipts"] == [
+        {"user_id": juniper.id, "last_read_message_id": first},
+        {"user_id": sarah.id, "last_read_message_id": second},
+    ]
+
+
+def test_only_members_can_mark_a_chat_read(client, users, chat):
+    _as(users[2])
+    response = client.post(f"/chats/{chat.id}/read")
+    assert response.status_code == 403
+    assert response.json()["detail"] == {"type": "not_a_member", "chat_id": chat.id}
+
+    response = client.post("/chats/999/read")
+    assert response.status_code == 404
+
+
+def test_read_marker_must_be_a_message_id(client, users, chat):
+    _as(users[0])
+    for message_id in (0, -1):
+        response = client.post(f"/chats/{chat.id}/read", json={"message_id": message_id})
+        assert response.status_code == 422
+
+
+def test_mark_read_creates_a_missing_entry_for_a_member(client, session, users, chat, post_message):
+    juniper, sarah, _ = users
+    post_message(sarah, chat, "hello")
+    session.delete(session.get(InboxEntryInDB, (juniper.id, chat.id)))
+    session.commit()
+
+    _as(juniper)
+    response = client.post(f"/chats/{chat.id}/read")
+    assert response.status_code == 200, response.text
+    assert response.json()["read_state"]["unread_count"] == 0
+
+
+def test_rebuild_keeps_watermarks(client, session, users, chat, post_message):
+    juniper, sarah, _ = users
+    first = post_message(sarah, chat, "one")["id"]
+    post_message(sarah, chat, "two")
+    _as(juniper)
+    client.post(f"/chats/{chat.id}/read", json={"message_id": first})
+
+    rebuild_inbox(session)
+
+    entry = session.get(InboxEntryInDB, (juniper.id, chat.id))
+    session.refresh(entry)
+    assert entry.last_read_message_id == first
+    assert entry.unread_count == 1
+
+
+def test_unread_counts_are_one_query_for_many_chats(client, session, users, query_counter):
+    juniper, sarah, _ = users
+    session.add_all([ChatInDB(name=f"chat {n}", owner=sarah, users=[juniper, sarah]) for n in range(20)])
+    session.commit()
+    rebuild_inbox(session)
+    for chat_id in range(1, 21):
+        _as(sarah)
+        client.post(f"/chats/{chat_id}/messages", json={"text": "ping"})
+
+    _as(juniper)
+    query_counter.reset()
+    response = client.get("/users/me/unread")
+
+    assert response.json()["meta"] == {"count": 20, "total": 20}
+    assert query_counter.count == 1, query_counter.statements
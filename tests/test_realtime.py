@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from backend.auth import get_current_user_id
+from backend.main import app
+from backend.realtime import ChatHub, get_hub
+from backend.schema import ChatInDB, UserInDB
+
+
+def test_hub_fans_out_to_chat_subscribers():
+    async def scenario():
+        hub = ChatHub()
+        async with hub.subscription(1) as first, hub.subscription(1) as second, hub.subscription(2) as other:
+            await hub.publish(1, {"type": "message", "id": 1})
+            assert first.get_nowait() == {"type": "message", "id": 1}
+            assert second.get_nowait() == {"type": "message", "id": 1}
+            assert other.empty()
+        assert hub.subscriber_count(1) == 0
+
+    asyncio.run(scenario())
+
+
+def test_hub_drops_oldest_event_for_slow_subscriber():
+    async def scenario():
+        hub = ChatHub(queue_size=2)
+        async with hub.subscription(1) as queue:
+            for i in range(3):
+                await hub.publish(1, {"id": i})
+            assert [queue.get_nowait()["id"] for _ in range(2)] == [1, 2]
+
+    asyncio.run(scenario())
+
+
+def test_create_message_publishes_to_hub(client, session):
+    user = UserInDB(username="juniper", email="juniper@cat.com", hashed_password="x")
+    chat = ChatInDB(name="nostromo", owner=user)
+    session.add(chat)
+    session.commit()
+    chat_id, user_id = chat.id, user.id
+
+    published = []
+
+    class RecordingHub(ChatHub):
+        async def publish(self, chat_id, event):
+            published.append((chat_id, event))
+
+    app.dependency_overrides[get_hub] = RecordingHub
+    app.dependency_overrides[get_current_user_id] = lambda: user_id
+
+    response = client.post(f"/chats/{chat_id}/messages", json={"text": "hello"})
+    assert response.status_code == 201
+    assert published == [(chat_id, {"type": "message", "message": response.json()["message"]})]
+
+
+def test_chat_websocket_rejects_unknown_chat(client):
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/chats/999/ws") as websocket:
+            websocket.receive_json()
+
+
+def test_get_chat_events_invalid_id(client):
+    response = client.get("/chats/999/events")
+    assert response.status_code == 404
@@ -0,0 +1,65 @@
+from sqlmodel import text
+
+from backend.schema import ChatInDB, MessageInDB, UserInDB
+from backend.search import rebuild_search_index
+
+
+def _seed(session):
+    juniper = UserInDB(username="juniper", email="juniper@cat.com", hashed_password="x")
+    bishop = UserInDB(username="bishop", email="bishop@android.com", hashed_password="x")
+    nostromo = ChatInDB(name="nostromo", owner=juniper)
+    sulaco = ChatInDB(name="sulaco", owner=bishop)
+    session.add_all([nostromo, sulaco])
+    session.commit()
+    session.add_all([
+        MessageInDB(text="the cat is on the ship", user_id=juniper.id, chat_id=nostromo.id),
+        MessageInDB(text="cat cat cat", user_id=juniper.id, chat_id=nostromo.id),
+        MessageInDB(text="bishop checks the cat", user_id=bishop.id, chat_id=sulaco.id),
+        MessageInDB(text="nothing to see here", user_id=bishop.id, chat_id=sulaco.id),
+    ])
+    session.commit()
+    return juniper.id, bishop.id, nostromo.id, sulaco.id
+
+
+def test_search_messages_ranked(client, session):
+    _seed(session)
+
+    response = client.get("/search/messages", params={"q": "cat"})
+    assert response.status_code == 200
+    texts = [m["text"] for m in response.json()["messages"]]
+    assert len(texts) == 3
+    assert texts[0] == "cat cat cat"
+
+
+def test_search_messages_filters_and_pages(client, session):
+    juniper_id, bishop_id, nostromo_id, sulaco_id = _seed(session)
+
+    by_chat = client.get("/search/messages", params={"q": "cat", "chat_id": sulaco_id}).json()
+    assert [m["text"] for m in by_chat["messages"]] == ["bishop checks the cat"]
+
+    by_user = client.get("/search/messages", params={"q": "cat", "user_id": juniper_id}).json()
+    assert {m["user"]["id"] for m in by_user["messages"]} == {juniper_id}
+
+    first = client.get("/search/messages", params={"q": "cat", "limit": 2}).json()
+    assert first["meta"]["next_offset"] == 2
+    second = client.get("/search/messages", params={"q": "cat", "limit": 2, "offset": 2}).json()
+    assert second["meta"]["count"] == 1 and second["meta"]["next_offset"] is None
+
+
+def test_search_messages_treats_query_syntax_as_text(client, session):
+    _seed(session)
+
+    response = client.get("/search/messages", params={"q": 'cat" OR (ship'})
+    assert response.status_code == 200
+    assert client.get("/search/messages", params={"q": "   "}).status_code == 422
+
+
+def test_rebuild_search_index(client, session):
+    _seed(session)
+    session.exec(text("INSERT INTO messages_fts(messages_fts) VALUES ('delete-all')"))
+    session.commit()
+    assert client.get("/search/messages", params={"q": "cat"}).json()["meta"]["count"] == 0
+
+    rebuild_search_index(session.connection())
+    session.commit()
+    assert client.get("/search/messages", params={"q": "cat"}).json()["meta"]["count"] == 3
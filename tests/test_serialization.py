@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
+
+from backend.models import ChatPublic, ChatsResponse, MessagePublic, MessagesResponse, UserPublic, UsersResponse
+from backend.schema import ChatInDB, MessageInDB, UserInDB
+
+
+@pytest.fixture
+def message(session, chat):
+    message = MessageInDB(text="hello", user_id=chat.owner_id, chat_id=chat.id)
+    session.add(message)
+    session.commit()
+    return message
+
+
+def _public(model, records):
+    return [model.from_orm(record).model_dump(mode="json") for record in records]
+
+
+def test_list_endpoints_match_public_models(client, session, chat, message):
+    users = client.get("/users").json()
+    UsersResponse.model_validate(users)
+    assert users["users"] == _public(UserPublic, session.exec(select(UserInDB)))
+
+    chats = client.get("/chats").json()
+    ChatsResponse.model_validate(chats)
+    assert chats["chats"] == _public(ChatPublic, session.exec(select(ChatInDB).options(joinedload(ChatInDB.owner))))
+    assert client.get(f"/users/{chat.owner_id}/chats").json() == chats
+
+    messages = client.get(f"/chats/{chat.id}/messages").json()
+    MessagesResponse.model_validate(messages)
+    assert messages["messages"] == _public(MessagePublic, session.exec(select(MessageInDB)))
+
+    assert client.get(f"/chats/{chat.id}/users").json()["users"] == users["users"]
+
+
+def test_get_chat_with_includes(client, session, chat, message):
+    body = client.get(f"/chats/{chat.id}", params={"include": ["messages", "users"]}).json()
+    assert body["chat"] == _public(ChatPublic, [chat])[0]
+    assert body["messages"] == _public(MessagePublic, session.exec(select(MessageInDB)))
+    assert body["users"] == _public(UserPublic, session.exec(select(UserInDB)))
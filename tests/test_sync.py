@@ -0,0 +1,80 @@
+import pytest
+
+from backend.auth import get_current_user_id
+from backend.main import app
+from backend.schema import ChatInDB, MessageInDB, UserChatLinkInDB, UserInDB
+
+
+@pytest.fixture
+def chats(session):
+    juniper = UserInDB(username="juniper", email="juniper@cat.com", hashed_password="x")
+    bishop = UserInDB(username="bishop", email="bishop@android.com", hashed_password="x")
+    nostromo = ChatInDB(name="nostromo", owner=juniper)
+    sulaco = ChatInDB(name="sulaco", owner=bishop)
+    session.add_all([nostromo, sulaco])
+    session.commit()
+    session.add_all([
+        UserChatLinkInDB(user_id=juniper.id, chat_id=nostromo.id),
+        UserChatLinkInDB(user_id=bishop.id, chat_id=sulaco.id),
+        MessageInDB(text="before", user_id=juniper.id, chat_id=nostromo.id),
+    ])
+    session.commit()
+    app.dependency_overrides[get_current_user_id] = lambda: 1
+    return nostromo.id, sulaco.id
+
+
+def test_initial_sync_returns_memberships_and_watermark(client, chats):
+    nostromo_id, _ = chats
+
+    body = client.get("/users/me/sync").json()
+    assert body["chat_ids"] == [nostromo_id]
+    assert [chat["name"] for chat in body["chats"]] == ["nostromo"]
+    assert body["messages"] == []
+    assert body["meta"]["watermark"]
+
+
+def test_sync_returns_only_changes_in_own_chats(client, session, chats):
+    nostromo_id, sulaco_id = chats
+    watermark = client.get("/users/me/sync").json()["meta"]["watermark"]
+
+    client.post(f"/chats/{nostromo_id}/messages", json={"text": "mine"})
+    session.add(MessageInDB(text="not mine", user_id=2, chat_id=sulaco_id))
+    session.commit()
+    client.put(f"/chats/{sulaco_id}", json={"name": "renamed"})
+
+    body = client.get("/users/me/sync", params={"since": watermark}).json()
+    # "before" was posted moments before the first sync, so it is sent again
+    assert [m["text"] for m in body["messages"]] == ["before", "mine"]
+    assert [chat["id"] for chat in body["chats"]] == [nostromo_id]
+
+    # Recent messages may be sent again, but nothing new is
+    again = client.get("/users/me/sync", params={"since": body["meta"]["watermark"]}).json()
+    assert {m["id"] for m in again["messages"]} <= {m["id"] for m in body["messages"]}
+
+
+def test_sync_pages_through_messages(client, session, chats):
+    nostromo_id, _ = chats
+    watermark = client.get("/users/me/sync").json()["meta"]["watermark"]
+    for i in range(3):
+        client.post(f"/chats/{nostromo_id}/messages", json={"text": f"message {i}"})
+
+    first = client.get("/users/me/sync", params={"since": watermark, "limit": 2}).json()
+    assert first["meta"]["has_more"]
+    second = client.get("/users/me/sync", params={"since": first["meta"]["watermark"], "limit": 2}).json()
+    received = {m["id"]: m["text"] for m in first["messages"] + second["messages"]}
+    assert sorted(received.values()) == ["before", "message 0", "message 1", "message 2"]
+    assert not second["meta"]["has_more"]
+
+
+def test_sync_resends_messages_committed_out_of_id_order(client, session, chats):
+    nostromo_id, _ = chats
+    session.add(MessageInDB(id=10, text="higher id, committed first", user_id=1, chat_id=nostromo_id))
+    session.commit()
+    watermark = client.get("/users/me/sync").json()["meta"]["watermark"]
+
+    # A slower transaction that was handed a lower id commits after the sync
+    session.add(MessageInDB(id=5, text="lower id, committed later", user_id=1, chat_id=nostromo_id))
+    session.commit()
+
+    body = client.get("/users/me/sync", params={"since": watermark}).json()
+    assert "lower id, committed later" in [m["text"] for m in body["messages"]]